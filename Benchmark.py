@@ -0,0 +1,216 @@
+import os, sys, abc, random, shutil, filecmp, tempfile
+from Deployer import Deployer, Source
+from Options import Options
+from Metrics import Metrics
+from FTPConnection import FTPConnection
+from LocalTransport import LocalTransport
+from FTPServer import FTPServer
+
+class Scenario (abc.ABC):
+	"""
+	A synthetic source tree deployed to an empty destination (and, if it is a redeploy, deployed again after a few changes)
+	"""
+	redeploy = False
+	
+	def __init__ (self, name, scale = 1.0, seed = 0):
+		self.name = name
+		self.scale = scale
+		self.random = random.Random(seed)
+	
+	def count (self, number):
+		return max(1, int(number * self.scale))
+	
+	def writeFile (self, path, size):
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		with open(path, "wb") as target:
+			while size > 0:
+				chunk = min(size, 1048576)
+				target.write(self.random.randbytes(chunk) if hasattr(self.random, "randbytes") else os.urandom(chunk))
+				size -= chunk
+	
+	@abc.abstractmethod
+	def build (self, path):
+		"""
+		Create the source tree in given directory
+		"""
+	
+	def change (self, path):
+		"""
+		Change the source tree between the deployments of a redeploy
+		"""
+		pass
+
+class SmallFiles (Scenario):
+	"""
+	Many small files in a shallow tree, the usual web application
+	"""
+	
+	def build (self, path):
+		for i in range(self.count(2000)):
+			self.writeFile(os.path.join(path, "dir{0}".format(i % 50), "file{0}.php".format(i)), self.random.randint(100, 8000))
+
+class HugeFiles (Scenario):
+	"""
+	A few large files (e.g. videos or downloads)
+	"""
+	
+	def build (self, path):
+		for i in range(3):
+			self.writeFile(os.path.join(path, "media", "file{0}.bin".format(i)), self.count(32 * 1048576))
+
+class DeepTree (Scenario):
+	"""
+	A few files in each directory of deeply nested chains of directories
+	"""
+	
+	def build (self, path):
+		for chain in range(self.count(10)):
+			directory = os.path.join(path, "chain{0}".format(chain))
+			for depth in range(40):
+				directory = os.path.join(directory, "level{0}".format(depth))
+				for i in range(3):
+					self.writeFile(os.path.join(directory, "file{0}.txt".format(i)), self.random.randint(10, 2000))
+
+class Redeploy (SmallFiles):
+	"""
+	The small files tree deployed again with 1 % of its files changed, one added and one removed (only the second deployment is measured)
+	"""
+	redeploy = True
+	
+	def change (self, path):
+		fileNames = sorted(os.path.join(directory, fileName) for directory, dirs, files in os.walk(path) for fileName in files if fileName.endswith(".php"))
+		for fileName in self.random.sample(fileNames, max(1, len(fileNames) // 100)):
+			self.writeFile(fileName, self.random.randint(100, 8000))
+		os.remove(fileNames[0])
+		self.writeFile(os.path.join(path, "new", "file.php"), 1000)
+
+class Benchmark:
+	"""
+	Deploys synthetic trees to a local directory or to the in-process FTP server and reports the time spent in each phase
+	"""
+	scenarios = {"small": SmallFiles, "huge": HugeFiles, "deep": DeepTree, "redeploy": Redeploy}
+	transferPhases = ("upload", "move", "remove", "rename", "manifest", "clean", "log")
+	
+	def __init__ (self, transport = "ftp", latency = 0, bandwidth = None, jobs = 1, compressionLevel = None, scale = 1.0, metricsFile = None):
+		self.transport = transport
+		self.latency = latency
+		self.bandwidth = bandwidth
+		self.jobs = jobs
+		self.compressionLevel = compressionLevel
+		self.scale = scale
+		self.metricsFile = metricsFile
+	
+	def getOptions (self, directory):
+		options = Options()
+		options.confirm = False
+		options.quiet = True
+		options.path = "/"
+		options.jobs = self.jobs
+		options.compressionLevel = self.compressionLevel
+		options.manifestCache = os.path.join(directory, "manifests")
+		return options
+	
+	def deploy (self, source, destination, options):
+		"""
+		Deploy the source directory, return the deployer, the (commands, bytes) counts of the server (None with the local transport)
+		and the metrics of the benchmark itself (the scan and the whole deployment)
+		"""
+		deployer = Deployer()
+		deployer.options = options
+		metrics = Metrics()
+		fileNames = []
+		with metrics.measure("scan") as phase:
+			for itemPath, isDir in Source(source, deployer.isIgnored, deployer.isPruned).walk():
+				if not isDir:
+					fileNames.append(itemPath)
+			phase["files"] = len(fileNames)
+		server = None
+		if self.transport == "ftp":
+			server = FTPServer(destination, self.latency, self.bandwidth).start()
+			host, port = server.getAddress()
+			connection = FTPConnection(host, "benchmark", "benchmark", options.path, options.bufferSize, port)
+		else:
+			connection = LocalTransport(destination, options.bufferSize)
+		workingDirectory = os.getcwd()
+		os.chdir(source)
+		try:
+			with metrics.measure("deploy"):
+				deployer.run(connection, options)
+		finally:
+			os.chdir(workingDirectory)
+			connection.disconnect()
+			if server is not None:
+				server.stop()
+		damaged = [fileName for fileName in fileNames if not self.isCopied(os.path.join(source, fileName), os.path.join(destination, fileName))]
+		if damaged:
+			raise RuntimeError("{0} files differ from the source after the deployment (e.g. {1})".format(len(damaged), damaged[0]))
+		return deployer, (server.commands, server.bytesTransferred) if server is not None else None, metrics
+	
+	def isCopied (self, sourceFile, destinationFile):
+		"""
+		Check that a file has been deployed unchanged (a transfer in the wrong mode would have altered it)
+		"""
+		return os.path.isfile(destinationFile) and filecmp.cmp(sourceFile, destinationFile, shallow = False)
+	
+	def runScenario (self, name):
+		"""
+		Get the (timings, counters) of a scenario, timings being a phase: seconds dictionary
+		"""
+		scenario = self.scenarios[name](name, self.scale)
+		directory = tempfile.mkdtemp(prefix = "deployer-benchmark-")
+		try:
+			source = os.path.join(directory, "source")
+			destination = os.path.join(directory, "destination")
+			os.makedirs(destination)
+			scenario.build(source)
+			deployer, counters, benchmarkMetrics = self.deploy(source, destination, self.getOptions(directory))
+			if scenario.redeploy:
+				scenario.change(source)
+				deployer, counters, benchmarkMetrics = self.deploy(source, destination, self.getOptions(directory))
+		finally:
+			shutil.rmtree(directory, ignore_errors = True)
+		metrics = deployer.metrics
+		if self.metricsFile:
+			metrics.save(self.metricsFile, {
+				"scenario": name, "transport": self.transport, "latency": self.latency, "bandwidth": self.bandwidth, "jobs": self.jobs, "scale": self.scale,
+				"scanTime": benchmarkMetrics.getTime("scan"), "deployTime": benchmarkMetrics.getTime("deploy")
+			})
+		return {
+			"scan": benchmarkMetrics.getTime("scan"),
+			"hash": metrics.getTime("hash"),
+			"diff": sum(metrics.getTime(phase) for phase in ("load", "verify", "diff")),
+			"transfer": sum(metrics.getTime(phase) for phase in self.transferPhases),
+			"total": benchmarkMetrics.getTime("deploy")
+		}, counters
+	
+	def run (self, names = None, output = sys.stdout):
+		"""
+		Run given scenarios (all of them by default) and print a table of their timings
+		"""
+		columns = ("scan", "hash", "diff", "transfer", "total")
+		output.write("{0:<10}".format("scenario") + "".join("{0:>10}".format(column) for column in columns) + "{0:>10}{1:>14}\n".format("commands", "bytes"))
+		results = {}
+		for name in names or self.scenarios:
+			timings, counters = self.runScenario(name)
+			results[name] = (timings, counters)
+			commands, transferred = counters or ("-", "-")
+			output.write("{0:<10}".format(name) + "".join("{0:>10.3f}".format(timings[column]) for column in columns) + "{0:>10}{1:>14}\n".format(commands, transferred))
+			output.flush()
+		return results
+
+if __name__ == "__main__":
+	from argparse import ArgumentParser
+	parser = ArgumentParser(description = "Measure deployments of synthetic source trees (hash includes the scan, times are in seconds)")
+	parser.add_argument("scenarios", nargs = "*", help = "Scenarios to run: {0} (defaults to all of them)".format(", ".join(Benchmark.scenarios)))
+	parser.add_argument("-t", "--transport", choices = ("ftp", "local"), default = "ftp", help = "Deploy to the in-process FTP server or straight to a local directory (defaults to ftp)")
+	parser.add_argument("--latency", type = float, default = 0, help = "Delay of each reply of the FTP server in seconds")
+	parser.add_argument("--bandwidth", type = int, help = "Bandwidth of the FTP server's data connections in bytes per second")
+	parser.add_argument("-j", "--jobs", type = int, default = 1, help = "Number of simultaneous connections")
+	parser.add_argument("-z", "--compress", dest = "compressionLevel", type = int, nargs = "?", const = 6, help = "Compress transfers with MODE Z")
+	parser.add_argument("--scale", type = float, default = 1.0, help = "Multiply the number (or size) of files in each tree")
+	parser.add_argument("--metrics", help = "Save the metrics of each scenario's deployment to given .ndjson or .jsonl file (one JSON object per line)")
+	args = parser.parse_args()
+	for name in args.scenarios:
+		if name not in Benchmark.scenarios:
+			parser.error("unknown scenario: {0}".format(name))
+	Benchmark(args.transport, args.latency, args.bandwidth, args.jobs, args.compressionLevel, args.scale, args.metrics).run(args.scenarios)
@@ -0,0 +1,159 @@
+import os, json, zipfile, secrets, tempfile, urllib.request, urllib.parse, urllib.error
+from exceptions import BundleError
+
+class Bundle:
+	"""
+	Packs files into zip archives that are unpacked on the server by a script uploaded along with them, so that deploying many
+	small files costs a few transfers instead of several round trips per file
+	
+	The script is invoked over HTTP, so the URL has to point to the destination's root directory as served by the web server.
+	A file:// URL pointing to the destination's root in the local filesystem makes the archives unpack locally instead.
+	"""
+	archiveLimit = 64 * 1024 * 1024 # Maximal amount of data packed into one archive in bytes
+	fileLimit = 1024 * 1024 # Larger files are uploaded one by one
+	minFiles = 10 # Fewer files aren't worth uploading and removing the script
+	timeout = 300
+	extractorTemplate = """<?php
+// Unpacks a deployment bundle into files named with given suffix and reports the names of the unpacked files
+$token = "{token}";
+if (!isset($_GET["token"]) || !hash_equals($token, (string) $_GET["token"])) {{
+	http_response_code(403);
+	exit;
+}}
+$archive = basename((string) $_GET["archive"]);
+$zip = new ZipArchive();
+if (strpos($archive, ".deployer-bundle-") !== 0 || $zip->open(__DIR__ . "/" . $archive) !== true) {{
+	http_response_code(400);
+	exit;
+}}
+$extracted = array();
+for ($i = 0; $i < $zip->numFiles; $i++) {{
+	$name = $zip->getNameIndex($i);
+	if ($name === false || $name === "" || $name[0] === "/" || preg_match('#(^|/)\\.\\.(/|$)#', $name)) {{
+		continue;
+	}}
+	$target = __DIR__ . "/" . $name . "{suffix}";
+	if (!is_dir(dirname($target)) && !mkdir(dirname($target), 0755, true)) {{
+		continue;
+	}}
+	$input = $zip->getStream($name);
+	$output = fopen($target, "wb");
+	if ($input === false || $output === false) {{
+		continue;
+	}}
+	stream_copy_to_stream($input, $output);
+	fclose($input);
+	fclose($output);
+	if ($zip->getExternalAttributesIndex($i, $system, $attributes) && $system == ZipArchive::OPSYS_UNIX) {{
+		chmod($target, ($attributes >> 16) & 0777);
+	}}
+	$extracted[] = $name;
+}}
+$zip->close();
+header("Content-Type: application/json");
+echo json_encode($extracted);
+"""
+	
+	def __init__ (self, url, suffix = "", archiveLimit = None):
+		"""
+		Set up a bundle unpacked through given URL (files are unpacked under their names with given suffix appended)
+		"""
+		self.url = url
+		self.suffix = suffix
+		self.archiveLimit = archiveLimit or self.archiveLimit
+		self.token = secrets.token_hex(16)
+		self.scriptName = ".deployer-extract-{0}.php".format(self.token)
+		self.archiveCount = 0
+	
+	def getScript (self):
+		"""
+		Get the source of the script that unpacks the archives on the server
+		"""
+		return self.extractorTemplate.format(token = self.token, suffix = self.suffix).encode("utf-8")
+	
+	def select (self, fileNames):
+		"""
+		Split file names into a list of files worth bundling and a list of files that should be uploaded one by one
+		"""
+		bundled = []
+		separate = []
+		for fileName in fileNames:
+			try:
+				size = os.path.getsize(fileName)
+			except OSError:
+				size = None
+			(bundled if size is not None and size <= self.fileLimit else separate).append(fileName)
+		if len(bundled) < self.minFiles:
+			return ([], list(fileNames))
+		return (bundled, separate)
+	
+	def pack (self, fileNames):
+		"""
+		A generator of (Archive name, Archive file, Packed file names) tuples, each archive holding at most archiveLimit bytes
+		of files (the archive file is closed once the next one is requested)
+		"""
+		batch = []
+		batchSize = 0
+		for fileName in fileNames:
+			size = os.path.getsize(fileName)
+			if batch and batchSize + size > self.archiveLimit:
+				yield from self.packBatch(batch)
+				batch = []
+				batchSize = 0
+			batch.append(fileName)
+			batchSize += size
+		if batch:
+			yield from self.packBatch(batch)
+	
+	def packBatch (self, fileNames):
+		self.archiveCount += 1
+		archiveName = ".deployer-bundle-{0}-{1}.zip".format(self.token, self.archiveCount)
+		with tempfile.TemporaryFile() as archiveFile:
+			with zipfile.ZipFile(archiveFile, "w", zipfile.ZIP_DEFLATED) as archive:
+				for fileName in fileNames:
+					archive.write(fileName, fileName)
+			archiveFile.seek(0)
+			yield (archiveName, archiveFile, fileNames)
+	
+	def extract (self, archiveName):
+		"""
+		Let the script unpack an uploaded archive and get the list of unpacked files
+		"""
+		if urllib.parse.urlparse(self.url).scheme == "file":
+			return self.extractLocal(urllib.request.url2pathname(urllib.parse.urlparse(self.url).path), archiveName)
+		query = urllib.parse.urlencode({"token": self.token, "archive": archiveName})
+		url = "{0}/{1}?{2}".format(self.url.rstrip("/"), urllib.parse.quote(self.scriptName), query)
+		try:
+			with urllib.request.urlopen(url, timeout = self.timeout) as response:
+				extracted = json.loads(response.read().decode("utf-8"))
+		except (urllib.error.URLError, OSError, ValueError) as error:
+			raise BundleError("Can't unpack {0} through {1}: {2}".format(archiveName, self.url, error))
+		if not isinstance(extracted, list):
+			raise BundleError("Unexpected response of the extractor script")
+		return extracted
+	
+	def extractLocal (self, root, archiveName):
+		"""
+		Unpack an archive the way the script does it, in a directory of the local filesystem
+		"""
+		extracted = []
+		try:
+			with zipfile.ZipFile(os.path.join(root, archiveName)) as archive:
+				for info in archive.infolist():
+					name = info.filename
+					if not name or name.startswith("/") or ".." in name.split("/"):
+						continue
+					target = os.path.join(root, name + self.suffix)
+					os.makedirs(os.path.dirname(target), exist_ok = True)
+					with archive.open(info) as source, open(target, "wb") as output:
+						while True:
+							chunk = source.read(1024 * 1024)
+							if not chunk:
+								break
+							output.write(chunk)
+					if info.create_system == 3:
+						os.chmod(target, (info.external_attr >> 16) & 0o777)
+					extracted.append(name)
+		except (OSError, zipfile.BadZipFile) as error:
+			raise BundleError("Can't unpack {0}: {1}".format(archiveName, error))
+		return extracted
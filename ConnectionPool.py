@@ -0,0 +1,100 @@
+import ftplib, socket, queue, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class ConnectionPool:
+	"""
+	A pool of FTP connections that processes files concurrently
+	"""
+	retries = 2
+	connectionErrors = (ConnectionError, socket.timeout, EOFError, ftplib.error_temp, ftplib.error_reply) # Not OSError, local errors aren't retried
+	
+	def __init__ (self, connection, size = 1):
+		"""
+		Set up the pool around an existing connection (other connections are opened when they are first needed)
+		"""
+		self.connection = connection
+		self.size = max(1, size or 1)
+		self.connections = [connection]
+		self.idle = queue.LifoQueue()
+		self.idle.put(connection)
+		self.lock = threading.Lock()
+	
+	def acquire (self):
+		"""
+		Get a connection that is not used by any other worker
+		"""
+		try:
+			return self.idle.get_nowait()
+		except queue.Empty:
+			pass
+		with self.lock:
+			if len(self.connections) < self.size:
+				connection = self.connection.clone()
+				self.connections.append(connection)
+				return connection
+		return self.idle.get()
+	
+	def release (self, connection):
+		"""
+		Return a connection to the pool
+		"""
+		self.idle.put(connection)
+	
+	def call (self, function, item):
+		"""
+		Call function(connection, item) with a pooled connection, reconnecting it if the connection fails
+		"""
+		connection = self.acquire()
+		try:
+			for attempt in range(self.retries + 1):
+				try:
+					return function(connection, item)
+				except self.connectionErrors:
+					if attempt == self.retries:
+						raise
+					connection.reconnect()
+		finally:
+			self.release(connection)
+	
+	def map (self, function, items, listener = None):
+		"""
+		Call function(connection, item) for every item, spreading the calls over the pool's connections
+		"""
+		items = list(items)
+		finished = 0
+		if listener:
+			listener.setValue(0)
+		if self.size == 1 or len(items) < 2:
+			for item in items:
+				self.call(function, item)
+				if listener:
+					finished += 1
+					listener.setValue((finished/len(items)) * 100)
+		else:
+			with ThreadPoolExecutor(max_workers = min(self.size, len(items))) as executor:
+				futures = [executor.submit(self.call, function, item) for item in items]
+				try:
+					for future in as_completed(futures):
+						future.result()
+						if listener:
+							finished += 1
+							listener.setValue((finished/len(items)) * 100)
+				except BaseException:
+					for future in futures:
+						future.cancel()
+					raise
+		if listener:
+			listener.finish()
+	
+	def close (self):
+		"""
+		Disconnect all connections opened by the pool (the original connection is left open)
+		"""
+		for connection in self.connections[1:]:
+			try:
+				connection.disconnect()
+			except ftplib.all_errors:
+				pass
+		self.connections = [self.connection]
+		self.idle = queue.LifoQueue()
+		self.idle.put(self.connection)
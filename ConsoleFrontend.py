@@ -2,8 +2,27 @@ class ConsoleFrontend:
 	noticeColor = 36
 	errorColor = 31
 	
+	def __init__ (self):
+		"""
+		Look up the size of the terminal and watch for its changes
+		"""
+		self.resize()
+		try:
+			signal.signal(signal.SIGWINCH, self.resize)
+		except (AttributeError, ValueError): # There is no SIGWINCH on this platform or we aren't in the main thread
+			pass
+	
+	def resize (self, signalNumber = None, frame = None):
+		"""
+		Update the width of the terminal window
+		"""
+		self.columns = shutil.get_terminal_size().columns
+	
 	def getListener (self):
-		return Progressbar()
+		return Progressbar(self)
+	
+	def getGroupListener (self, count):
+		return ProgressGroup(self, count)
 	
 	def output (self, message, important = False, error = False, breakLine = True):
 		stream = sys.stdout if not error else sys.stderr
@@ -14,7 +33,7 @@ class ConsoleFrontend:
 		if breakLine:
 			message = message + "\n"
 		stream.write(message)
-			
+	
 	def confirm (self, question, default = True):
 		answer = input(question + " [Y/n] ")
 		if not answer:
@@ -23,20 +42,22 @@ class ConsoleFrontend:
 			return False
 		return True
 
-import sys, os
+import sys, shutil, signal, time, threading
 
 class Progressbar:
 	"""
 	A class that manages progressbar rendering
 	"""
+	frameInterval = 0.1 # Minimal time between two repaints in seconds
 	
-	def __init__ (self, message = None):
+	def __init__ (self, frontend = None, message = None):
 		"""
 		Set up the progressbar
 		"""
+		self.frontend = frontend
 		self.message = message
-		self.columns = self.getConsoleWidth()
-		self.messageLength = self.columns // 2
+		self.progress = None
+		self.lastRepaint = 0
 	
 	def setMessage (self, message):
 		self.message = message
@@ -45,52 +66,53 @@ class Progressbar:
 		"""
 		Get the width of the terminal window
 		"""
-		rows, columns = os.popen('stty size', 'r').read().split()
-		return int(columns)
+		if self.frontend:
+			return self.frontend.columns
+		return shutil.get_terminal_size().columns
 	
-	def truncateTitle (self, value):
+	def truncateTitle (self, value, length):
 		"""
 		Shorten the progressbar's message so that it doesn't mess anything up
 		"""
-		if len(value) > self.messageLength:
-			value = "..." + value[-(self.messageLength - 3) : ]
+		if len(value) > length:
+			value = "..." + value[-(length - 3) : ]
 		else:
-			value = value + (" " * (self.messageLength - len(value)))
+			value = value + (" " * (length - len(value)))
 		return value
 	
 	def setValue (self, progress):
 		"""
-		Set the value of progressbar's progress and repaints it to show this progress
+		Set the value of progressbar's progress and repaint it if the last repaint is old enough
 		"""
 		self.progress = int(progress)
-		self.repaint()
+		now = time.monotonic()
+		if now - self.lastRepaint >= self.frameInterval:
+			self.lastRepaint = now
+			self.repaint()
 	
 	def clear (self):
 		"""
 		Clear the progressbar's row
 		"""
-		for i in range(1, self.columns):
-			sys.stdout.write("\b \b")
+		sys.stdout.write("\r\033[K")
+	
+	def render (self):
+		"""
+		Get the text of the progressbar's row
+		"""
+		columns = self.getConsoleWidth()
+		messageLength = columns // 2
+		barLength = max(0, columns - messageLength - 4 - 2 - 2 - 1) # Percents, empty spaces, brackets and the cursor
+		progress = 100 if self.progress is None else self.progress # If no value was set, the rendering had finished before setting any
+		filled = (barLength * progress) // 100
+		return "{0} [{1}{2}] {3:3}%".format(self.truncateTitle(self.message or "", messageLength), "#" * filled, "-" * (barLength - filled), progress)
 	
 	def repaint (self, finish = False):
 		"""
-		Repaint the progressbar to keep it up to date with any changes
+		Repaint the progressbar to keep it up to date with any changes (with a single write)
 		"""
-		self.clear()
-		barLength = self.columns - self.messageLength - 4 - 2 - 2 # Percents, empty spaces and brackets
-		bar = str()
-		try:
-			progress = self.progress
-		except AttributeError: # If self.progress is not set, it means the rendering had finished before setting any value
-			progress = 100
-		for i in range(1, barLength):
-			bar += "#" if (i / (barLength / float(100))) < progress else "-"
-		percent = ("{0:3}".format(progress)) + "%"
-		sys.stdout.write("{0} [{1}] {2}".format(self.truncateTitle(self.message), bar, percent))
-		if not finish:
-			sys.stdout.flush()
-		else:
-			sys.stdout.write("\n")
+		sys.stdout.write("\r" + self.render() + "\033[K" + ("\n" if finish else ""))
+		sys.stdout.flush()
 	
 	def finish (self):
 		"""
@@ -98,3 +120,58 @@ class Progressbar:
 		"""
 		self.progress = 100
 		self.repaint(True)
+
+class ProgressGroup (Progressbar):
+	"""
+	A progressbar that shows the overall progress of many (possibly concurrent) transfers
+	"""
+	
+	def __init__ (self, frontend, count, message = None):
+		"""
+		Set up the progressbar for given number of transfers
+		"""
+		super().__init__(frontend, message)
+		self.count = count
+		self.finished = 0
+		self.values = {}
+		self.lock = threading.Lock()
+	
+	def getListener (self):
+		"""
+		Get a listener for one of the transfers
+		"""
+		return ProgressGroupMember(self)
+	
+	def update (self, member, value = None):
+		"""
+		Record the progress of a transfer (None means the transfer has finished)
+		"""
+		with self.lock:
+			if value is None:
+				self.values.pop(member, None)
+				self.finished += 1
+			else:
+				self.values[member] = value
+			total = (self.finished * 100 + sum(self.values.values())) / max(1, self.count)
+			self.setValue(min(100, total))
+	
+	def finish (self):
+		with self.lock:
+			super().finish()
+
+class ProgressGroupMember:
+	"""
+	A listener of one transfer in a progress group
+	"""
+	
+	def __init__ (self, group):
+		self.group = group
+	
+	def setMessage (self, message):
+		pass
+	
+	def setValue (self, progress):
+		self.group.update(self, progress)
+	
+	def finish (self):
+		self.group.update(self)
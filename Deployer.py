@@ -1,22 +1,55 @@
 #!/usr/bin/python3
 # TODO: config file, TESTING, IO encoding/decoding, empty directories with permissions... exceptions
-import re, os, sys, io, time
-from exceptions import FileNotFoundError, ConnectionError
+import re, os, sys, io, time, tempfile, zlib, gzip, subprocess, threading
+from exceptions import FileNotFoundError, ConnectionError, CommandNotSupportedError, GitError, BundleError, ManifestError, HashError, OptionError
+from HashCache import HashCache
+from Hasher import Hasher
+from ConnectionPool import ConnectionPool
+from DiffEngine import DiffEngine
+from FileMap import FileMap
+from Manifest import Manifest
+from ManifestCache import ManifestCache
+from TransferJournal import TransferJournal
+from Bundle import Bundle
+from Metrics import Metrics
+from Scheduler import TransferScheduler, TokenBucket
+from Watcher import Watcher, PollingWatcher
 
 class Deployer:
 	"""
 	The script's controller class
 	"""
+	hashLock = threading.Lock() # Deployers of several targets share their source files, only one of them hashes at a time
 	
-	def __init__ (self, frontend = None):
+	def __init__ (self, frontend = None, sourceFiles = None):
+		"""
+		Set up the deployer (deployers of several targets can share an algorithm: source files dictionary, so that the source
+		is only hashed once)
+		"""
 		self.frontend = frontend
 		
-		self.ignorePatterns = None
-		self.keepPatterns = None
+		self.ignoreMatcher = None
+		self.pruneMatcher = None
+		self.keepMatcher = None
+		
+		self.connection = None
+		self.pool = None
+		self.transferJournal = None
+		self.metrics = Metrics()
 		
-		self.sourceFiles = {}
+		self.sourceFiles = {} if sourceFiles is None else sourceFiles
 		self.updatedFiles = {}
 		self.redundantFiles = []
+		self.movedFiles = None
+		self.destination = None
+		self.algorithm = None
+		self.bandwidthLimit = None # Targets of a fan-out can share a limit
+	
+	def measure (self, phase):
+		"""
+		A context manager that adds what happens in it to the metrics of given phase of the deployment (it yields the phase's record)
+		"""
+		return self.metrics.measure(phase, lambda: self.pool.connections if self.pool else [])
 	
 	def parseFilePatterns (self, patterns):
 		if patterns:
@@ -31,93 +64,459 @@ class Deployer:
 		else:
 			return
 	
+	def combinePatterns (self, patterns):
+		"""
+		Compile regular expressions into a single one that matches whatever any of them matches
+		"""
+		patterns = ["(?:" + pattern.pattern + ")" for pattern in patterns]
+		return re.compile("|".join(patterns) if patterns else "(?!)")
+	
+	def compileIgnorePatterns (self):
+		patterns = list(self.parseFilePatterns(getattr(self.options, "ignore", None)))
+		self.ignoreMatcher = self.combinePatterns(patterns)
+		# Patterns ending with a wildcard match everything under a directory they match, so such directories needn't be scanned
+		self.pruneMatcher = self.combinePatterns([pattern for pattern in patterns if pattern.pattern.endswith(".*$")])
+	
 	def isIgnored (self, fileName):
 		"""
 		Check if given file should be ignored according to configuration
 		"""
-		if fileName == self.options.configFile:
+		if fileName in (self.options.configFile, self.options.hashCache):
 			return True
-		if self.ignorePatterns is None:
-			try:
-				self.ignorePatterns = list(self.parseFilePatterns(self.options.ignore))
-			except AttributeError:
-				pass
-		for rule in self.ignorePatterns:
-			if rule.match(fileName):
-				return True
-		return False
+		journal = self.options.transferJournal
+		if journal and (fileName == journal or fileName.startswith(journal + ".")): # Journals of fan-out targets and temporary files
+			return True
+		if self.ignoreMatcher is None:
+			self.compileIgnorePatterns()
+		return self.ignoreMatcher.match(fileName) is not None
+	
+	def isPruned (self, dirName):
+		"""
+		Check if all contents of given directory (named with a trailing slash) are ignored, so that it doesn't have to be scanned at all
+		"""
+		if self.options.gitIndex and (dirName == ".git/" or dirName.endswith("/.git/")): # Never part of the source read from git
+			return True
+		if self.pruneMatcher is None:
+			self.compileIgnorePatterns()
+		return self.pruneMatcher.match(dirName) is not None
+	
+	def compileKeepPatterns (self):
+		self.keepMatcher = self.combinePatterns(self.parseFilePatterns(getattr(self.options, "keep", None)))
 	
 	def isKept (self, fileName):
-		if self.keepPatterns is None:
+		if self.keepMatcher is None:
+			self.compileKeepPatterns()
+		return self.keepMatcher.match(fileName) is not None
+	
+	def getScheduler (self):
+		"""
+		Get the scheduler that orders uploads by the priority patterns of the configuration and by size
+		"""
+		return TransferScheduler(self.parseFilePatterns(getattr(self.options, "priority", None)))
+	
+	def getBandwidthLimit (self):
+		"""
+		Get the bandwidth limit shared by all connections (None if there is no limit), it is kept for later deployments
+		"""
+		if self.bandwidthLimit is None and self.options.bandwidthLimit:
+			self.bandwidthLimit = TokenBucket(TokenBucket.parseRate(self.options.bandwidthLimit), TokenBucket.parseHours(self.options.bandwidthHours))
+		return self.bandwidthLimit
+	
+	def getHashCache (self):
+		"""
+		Get the persistent cache of source file hashes (None if it is disabled)
+		"""
+		if not self.options.hashCache:
+			return None
+		cache = HashCache(self.options.hashCache)
+		if self.options.rehash:
+			cache.clear()
+		return cache
+	
+	def getDestinationKey (self):
+		"""
+		Get a string identifying the destination
+		"""
+		return "|".join(str(value) for value in (self.options.host, self.options.username, self.options.path, self.options.section))
+	
+	def getManifestCache (self):
+		"""
+		Get the local cache of the destination's objects files (None if it is disabled)
+		"""
+		if not self.options.manifestCache:
+			return None
+		return ManifestCache(self.options.manifestCache, self.getDestinationKey())
+	
+	def getTransferJournal (self):
+		"""
+		Get the local journal of uploads staged in the destination (None if it is disabled)
+		"""
+		if not self.options.transferJournal:
+			return None
+		fileName = self.options.transferJournal
+		if self.options.targets: # Targets deployed at once need a journal each
+			fileName += "." + self.options.section
+		return TransferJournal(fileName, self.getDestinationKey())
+	
+	def getSource (self, algorithm = None):
+		"""
+		Get the source directory (the current one) with ignored files left out, read from the git index if the configuration says so
+		"""
+		if self.options.gitIndex:
 			try:
-				self.keepPatterns = list(self.parseFilePatterns(self.options.keep))
-			except AttributeError:
-				pass
-		for rule in self.keepPatterns:
-			if rule.match(fileName):
-				return True
-		return False
+				return GitSource(os.getcwd(), self.isIgnored, self.isPruned, algorithm)
+			except GitError as error:
+				self.output("Can't read the git index ({0}), scanning the directory instead".format(error), error = True)
+		return Source(os.getcwd(), self.isIgnored, self.isPruned, algorithm)
 	
 	def getSourceFiles (self, source):
 		"""
 		Get a file name: file sum dictionary of source files
 		"""
-		if not self.sourceFiles:
-			self.sourceFiles = {name: checksum for name, checksum in source.getFiles() if not self.isIgnored(name)}
-		return self.sourceFiles
+		with self.hashLock:
+			if source.algorithm not in self.sourceFiles:
+				cache = self.getHashCache() if source.algorithm == Hasher.algorithm else None # The cache only holds hashes of the default algorithm
+				hasher = Hasher(self.options.hashWorkers, source.algorithm)
+				self.sourceFiles[source.algorithm] = FileMap(self.options.memoryLimit, source.getFiles(cache, hasher))
+				if cache is not None:
+					cache.compact()
+					cache.save()
+			return self.sourceFiles[source.algorithm]
+	
+	def compare (self, source, destination):
+		"""
+		Sort the files into updated, redundant and moved ones with a single merge pass over the sorted source and destination lists
+		"""
+		self.updatedFiles = FileMap(self.options.memoryLimit)
+		self.redundantFiles = []
+		self.movedFiles = {}
+		addedFiles = []
+		removedHashes = {}
+		engine = DiffEngine()
+		for name, status, sourceHash, destinationHash in engine.diff(self.getSourceFiles(source).items(), destination.getItems()):
+			if status in (engine.added, engine.modified):
+				self.updatedFiles[name] = sourceHash
+				if status == engine.added:
+					addedFiles.append(name)
+			elif status == engine.removed and name != self.options.logFile:
+				self.redundantFiles.append(name)
+				removedHashes.setdefault(destinationHash, []).append(name)
+		if self.options.detectMoves and removedHashes:
+			self.detectMoves(addedFiles, removedHashes)
+	
+	def detectMoves (self, addedFiles, removedHashes):
+		"""
+		Turn added files that have the same content as removed ones into moves of the removed files
+		"""
+		for name in addedFiles:
+			originals = removedHashes.get(self.updatedFiles[name])
+			if originals and not self.isKept(name):
+				self.movedFiles[name] = originals.pop()
+				del self.updatedFiles[name]
+		if self.movedFiles:
+			movedOriginals = set(self.movedFiles.values())
+			self.redundantFiles = [name for name in self.redundantFiles if name not in movedOriginals]
+	
+	def verifyFiles (self, source, destination):
+		"""
+		Check that the files the objects file lists as up to date really match the source, using hashes computed by the server
+		if it can compute them (sizes and modification times otherwise), spreading the checks over the connection pool
+		Return a (file name: reason dictionary of files that differ, file name: reason dictionary of files that couldn't be checked) tuple
+		"""
+		sourceFiles = self.getSourceFiles(source)
+		fileNames = [name for name, checksum in destination.getItems() if sourceFiles.get(name) == checksum]
+		algorithms = self.connection.getHashAlgorithms()
+		algorithm = (source.algorithm if source.algorithm in algorithms else algorithms[0]) if algorithms else None
+		hasher = Hasher(1, algorithm) if algorithm else None
+		updateTime = destination.getUpdateTime()
+		drifted = {}
+		unverifiable = {}
+		def checkStamp (connection, fileName):
+			stamp = destination.getStamp(fileName, connection)
+			if stamp is None:
+				drifted[fileName] = "missing"
+			elif stamp[0] != os.path.getsize(fileName):
+				drifted[fileName] = "size differs"
+			elif updateTime is not None and stamp[1] is not None and stamp[1][:14] > updateTime[:14]:
+				drifted[fileName] = "modified after the last deployment"
+		def check (connection, fileName):
+			nonlocal algorithm
+			if algorithm is None:
+				return checkStamp(connection, fileName)
+			try:
+				remoteHash = destination.getRemoteHash(fileName, hasher.algorithm, connection)
+			except CommandNotSupportedError: # The server has refused the hash command, the remaining files are checked by their stamps
+				algorithm = None
+				return checkStamp(connection, fileName)
+			except HashError as error:
+				unverifiable[fileName] = str(error)
+				return
+			if remoteHash is None:
+				drifted[fileName] = "missing"
+			elif remoteHash != (sourceFiles[fileName] if hasher.algorithm == source.algorithm else hasher.hashFile(fileName)):
+				drifted[fileName] = "content differs"
+		self.pool.map(check, fileNames, self.getListener("Verifying {0} files".format(len(fileNames))))
+		return (drifted, unverifiable)
 	
 	def getUpdatedFiles (self, source, destination):
 		"""
-		Get a file name: file sum dictionary of updated files
+		Get a file name: file sum mapping of updated files
 		"""
-		if not self.updatedFiles:
-			self.updatedFiles = {name: checksum for name, checksum in self.getSourceFiles(source).items() if not destination.hasFile(name, checksum)}
+		if self.movedFiles is None:
+			self.compare(source, destination)
 		return self.updatedFiles
 	
 	def getRedundantFiles (self, source, destination):
 		"""
 		Get a list of files that are no longer present in the source but are still in the destination
 		"""
-		if not self.redundantFiles:
-			sourceFiles = list(self.getSourceFiles(source).keys()) + [self.options.logFile]
-			self.redundantFiles = [name for name in destination.getFiles() if not name in sourceFiles]
+		if self.movedFiles is None:
+			self.compare(source, destination)
 		return self.redundantFiles
 	
-	def renameUpdatedFiles (self, destination, updatedFiles, listener = None):
+	def getMovedFiles (self, source, destination):
+		"""
+		Get a new file name: original file name dictionary of files that were only moved or renamed in the source
+		"""
+		if self.movedFiles is None:
+			self.compare(source, destination)
+		return self.movedFiles
+	
+	def renameUpdatedFiles (self, destination, updatedFiles, listener = None, pool = None, scheduler = None):
 		"""
 		Rename successfully updated files in the destination
+		If a scheduler is given, files of each priority are put in place only once all more urgent ones are
 		"""
-		if listener:
-			fileCount = len(updatedFiles)
-			finished = 0
-		for fileName in updatedFiles:
+		def rename (connection, fileName):
 			if (not self.isKept(fileName)) or (not destination.hasFile(fileName)):
-				destination.rename(fileName + ".new", fileName)
+				destination.rename(fileName + ".new", fileName, connection)
+		if pool is None:
+			pool = ConnectionPool(destination.connection)
+		if self.keepMatcher is None:
+			self.compileKeepPatterns() # Before the patterns are used by several threads
+		groups = scheduler.group(updatedFiles) if scheduler else [list(updatedFiles)]
+		if len(groups) < 2:
+			pool.map(rename, groups[0] if groups else [], listener)
+			return
+		renamed = 0
+		for group in groups:
+			pool.map(rename, group)
+			renamed += len(group)
 			if listener:
-				finished += 1
-				listener.setValue((finished/fileCount) * 100)
+				listener.setValue((renamed/len(updatedFiles)) * 100)
 		if listener:
 			listener.finish()
 	
+	def stageFile (self, destination, fileName, listener = None, connection = None):
+		"""
+		Upload a file to the destination under its temporary name, resuming an interrupted upload or skipping a finished one
+		if the transfer journal knows about it
+		"""
+		journal = self.transferJournal
+		if journal is None:
+			return destination.upload(fileName, listener = listener, connection = connection)
+		checksum = self.updatedFiles[fileName]
+		state = journal.get(fileName, checksum)
+		if state == journal.staged and destination.isStaged(fileName, connection):
+			if listener:
+				listener.finish()
+			return
+		# The file is only marked as partial once the transfer has started: the temporary file may be left by anything else (e.g.
+		# an upload of an older version) before that, so it is only resumed if this checksum has been written to it
+		onOpen = lambda: journal.set(fileName, checksum, journal.partial)
+		destination.upload(fileName, listener = listener, connection = connection, resume = state is not None, onOpen = onOpen)
+		journal.set(fileName, checksum, journal.staged)
+	
+	def uploadFiles (self, destination, fileNames):
+		"""
+		Upload given files to the destination, concurrently if the connection pool allows it
+		"""
+		try:
+			if self.pool.size > 1:
+				group = self.getGroupListener("Uploading {0} files".format(len(fileNames)), len(fileNames))
+				upload = lambda connection, fileName: self.stageFile(destination, fileName, group.getListener() if group else None, connection)
+				self.pool.map(upload, fileNames)
+				if group:
+					group.finish()
+			else:
+				upload = lambda connection, fileName: self.stageFile(destination, fileName, self.getListener(fileName), connection)
+				self.pool.map(upload, fileNames)
+		finally:
+			if self.transferJournal is not None:
+				self.transferJournal.save()
+	
+	def uploadBundles (self, destination, fileNames):
+		"""
+		Upload small files packed in archives that are unpacked next to the files they replace by a script on the server
+		Return a list of files that still have to be uploaded one by one
+		"""
+		bundle = Bundle(self.options.bundleUrl, self.connection.getSafeFilename(""), self.options.bundleSize)
+		bundled, separate = bundle.select(fileNames)
+		if not bundled:
+			return fileNames
+		staged = set()
+		try:
+			self.connection.upload(io.BytesIO(bundle.getScript()), bundle.scriptName)
+			for archiveName, archiveFile, packedNames in bundle.pack(bundled):
+				self.output("Uploading {0} files in {1}...".format(len(packedNames), archiveName))
+				self.connection.upload(archiveFile, archiveName, listener = self.getListener(archiveName))
+				try:
+					extracted = bundle.extract(archiveName)
+				finally:
+					destination.remove(archiveName)
+				staged.update(set(extracted) & set(packedNames))
+		except BundleError as error:
+			self.output("{0}, uploading the files one by one".format(error), error = True)
+		finally:
+			destination.remove(bundle.scriptName)
+		if self.transferJournal is not None:
+			for fileName in staged:
+				self.transferJournal.set(fileName, self.updatedFiles[fileName], self.transferJournal.staged)
+		return [fileName for fileName in fileNames if fileName not in staged]
+	
+	def moveFiles (self, destination, movedFiles):
+		"""
+		Move files in the destination instead of uploading them again, concurrently if the connection pool allows it
+		"""
+		def move (connection, fileName):
+			try:
+				destination.move(movedFiles[fileName], fileName, connection)
+			except FileNotFoundError: # The original is gone from the server, so the file is uploaded after all
+				destination.upload(fileName, rename = True, connection = connection)
+		self.pool.map(move, sorted(movedFiles), self.getListener("Moving {0} files".format(len(movedFiles))))
+	
+	def removeFiles (self, destination, fileNames):
+		"""
+		Remove given files from the destination, concurrently if the connection pool allows it
+		"""
+		if self.pool.size > 1:
+			remove = lambda connection, fileName: destination.remove(fileName, connection = connection)
+			self.pool.map(remove, fileNames, self.getListener("Removing {0} files".format(len(fileNames))))
+		else:
+			def remove (connection, fileName):
+				self.output("Removing {0}...".format(fileName))
+				destination.remove(fileName, connection = connection)
+			self.pool.map(remove, fileNames)
+	
+	def cleanDir (self, destination, path):
+		"""
+		Remove the contents of a directory in the destination (files are removed concurrently, directories afterwards)
+		"""
+		try:
+			entries = destination.walkDir(path)
+		except FileNotFoundError:
+			return
+		fileNames = [name for name, isDir in entries if not isDir]
+		if fileNames:
+			self.removeFiles(destination, fileNames)
+		for name, isDir in reversed(entries):
+			if isDir:
+				destination.rmdir(name)
+	
+	def connect (self, options):
+		"""
+		Open a connection to the destination given by the options (a file:// host is a directory in the local filesystem)
+		"""
+		if options.host and options.host.startswith("file://"):
+			from LocalTransport import LocalTransport
+			return LocalTransport(os.path.join(options.host[len("file://"):], (options.path or "").lstrip("/")), options.bufferSize)
+		from FTPConnection import FTPConnection
+		return FTPConnection(options.host, options.username, options.password, options.path, options.bufferSize)
+	
 	def generateObjects (self, options):
 		self.options = options
 		with open("objects", "w") as objectsFile:
-			objectsFile.write('\n'.join([(name + ': ' + checksum) for name, checksum in self.getSourceFiles(Source(os.getcwd())).items()]))
+			objectsFile.write('\n'.join([(name + ': ' + checksum) for name, checksum in self.getSourceFiles(self.getSource(Manifest.legacyAlgorithm)).items()]))
 	
 	def run (self, connection, options):
 		"""
-		Process the deployment
+		Process the deployment, profiling it and writing its metrics if the configuration says so
+		"""
+		profiler = None
+		if options.profile:
+			import cProfile
+			profiler = cProfile.Profile()
+			profiler.enable()
+		completed = False
+		try:
+			if options.watch:
+				self.watch(connection, options)
+			else:
+				self.deploy(connection, options)
+			completed = True
+		finally:
+			if profiler is not None:
+				profiler.disable()
+				profiler.dump_stats(options.profile)
+			if options.metrics:
+				self.metrics.save(options.metrics, {"host": options.host, "path": options.path, "section": options.section, "dry": options.dry, "jobs": options.jobs, "completed": completed})
+	
+	def deploy (self, connection, options):
+		"""
+		Compare the source with the destination and apply the changes
 		"""
 		self.options = options
 		self.connection = connection
-		destination = Destination(self.connection)
-		source = Source(os.getcwd())
-		sourceFiles = self.getSourceFiles(source)
-		destinationFiles = destination.getFiles(self.getListener("Getting object list"))
-		updatedFiles = self.getUpdatedFiles(source, destination)
-		updatedFileNames = sorted(updatedFiles.keys())
+		if options.compressionLevel is not None:
+			connection.setCompression(options.compressionLevel, options.uncompressedExtensions)
+		connection.setBandwidthLimit(self.getBandwidthLimit())
+		self.pool = ConnectionPool(connection, options.jobs)
+		destination = Destination(self.connection, options.memoryLimit, self.getManifestCache())
+		source = self.getSource()
+		with self.measure("hash") as phase:
+			sourceFiles = self.getSourceFiles(source)
+			phase["files"] = len(sourceFiles)
+		with self.measure("load") as phase:
+			destination.load(self.getListener("Getting object list"))
+			phase["files"] = len(destination.files.files)
+		algorithm = source.algorithm
+		destinationAlgorithm = destination.getAlgorithm()
+		if destinationAlgorithm not in (None, algorithm): # Compare with hashes of the algorithm the objects file uses, but write the new one with the source's algorithm
+			self.output("The object list uses {0} hashes, it will be converted to {1}".format(destinationAlgorithm, algorithm), important = True)
+			source = self.getSource(destinationAlgorithm)
+		driftedFiles = {}
+		if options.verify:
+			with self.measure("verify") as phase:
+				driftedFiles, unverifiableFiles = self.verifyFiles(source, destination)
+				phase["files"] = len(destination.files.files)
+			if driftedFiles:
+				self.output("Files changed in the destination:", important = True)
+				self.output("\n".join("{0} ({1})".format(name, driftedFiles[name]) for name in sorted(driftedFiles)))
+				for fileName in driftedFiles: # They are uploaded again
+					destination.forget(fileName)
+			if unverifiableFiles:
+				self.output("Files that couldn't be verified:", important = True, error = True)
+				self.output("\n".join("{0} ({1})".format(name, unverifiableFiles[name]) for name in sorted(unverifiableFiles)))
+			if not driftedFiles and not unverifiableFiles:
+				self.output("All files in the destination match the object list.", important = True)
+		with self.measure("diff") as phase:
+			updatedFiles = self.getUpdatedFiles(source, destination)
+			phase["files"] = len(self.getSourceFiles(source))
+		updatedFileNames = list(updatedFiles.keys())
 		redundantFiles = self.getRedundantFiles(source, destination)
-		if updatedFiles:
+		movedFiles = self.getMovedFiles(source, destination)
+		self.outputChanges(updatedFileNames, redundantFiles, movedFiles)
+		if not options.dry and (updatedFiles or redundantFiles or movedFiles):
+			if options.confirm and not options.quiet:
+				if not self.confirm("Do you want to apply these changes?"):
+					self.interrupt()
+			rebuild = not (options.journal and destinationAlgorithm == algorithm and not driftedFiles)
+			self.applyChanges(destination, sourceFiles, algorithm, rebuild)
+		self.destination = destination
+		self.algorithm = algorithm
+		roundTripsSaved = sum(connection.roundTripsSaved for connection in self.pool.connections)
+		if roundTripsSaved:
+			self.output("Saved {0} round trips to the server".format(roundTripsSaved))
+		bytesSaved = sum(connection.bytesSaved for connection in self.pool.connections)
+		if bytesSaved > 0:
+			self.output("Compression saved {0} bytes of transfers".format(bytesSaved))
+		self.pool.close()
+	
+	def outputChanges (self, updatedFileNames, redundantFiles, movedFiles):
+		"""
+		List the files that are going to be uploaded, deleted and moved
+		"""
+		if updatedFileNames:
 			self.output("Files to be uploaded:", important = True)
 			self.output("\n".join(updatedFileNames))
 		else:
@@ -125,54 +524,226 @@ class Deployer:
 		if redundantFiles:
 			self.output("Files to be deleted:", important = True)
 			self.output("\n".join(redundantFiles))
-		if not options.dry and (updatedFiles or redundantFiles):
-			if options.confirm and not options.quiet:
-				if not self.confirm("Do you want to apply these changes?"):
-					self.interrupt()
-			if updatedFiles: 
-				self.output("Uploading new files...", important = True) 
-				for fileName in updatedFileNames:
-					destination.upload(fileName, listener = self.getListener(fileName))
-			if redundantFiles: 
-				self.output("Removing redundant files...", important = True) 
-				for fileName in redundantFiles:
-					self.output("Removing {0}...".format(fileName))
-					destination.remove(fileName)
-			self.renameUpdatedFiles(destination, updatedFiles, self.getListener("Renaming successfully uploaded files"))
-			destination.rebuildFileList(sourceFiles, self.getListener("Updating object list"))
-			if options.enableClean and options.clean:
+		if movedFiles:
+			self.output("Files to be moved:", important = True)
+			self.output("\n".join("{0} -> {1}".format(movedFiles[name], name) for name in sorted(movedFiles)))
+	
+	def watch (self, connection, options):
+		"""
+		Deploy, then keep the connection open and deploy changes of the source as soon as they happen (until interrupted)
+		Changes are deployed without confirmation and appended to the journal of the object list
+		"""
+		self.deploy(connection, options)
+		options.confirm = False # The changes are deployed as they come from now on
+		watcher = Watcher.create(os.getcwd(), self.isPruned, options.watchDebounce, options.watchPolling)
+		self.output("Watching for changes{0}...".format(" (polling)" if isinstance(watcher, PollingWatcher) else ""), important = True)
+		outdated = False # A full comparison is needed
+		try:
+			while True:
+				try:
+					changes = watcher.wait(options.keepAliveInterval)
+				except OSError as error: # Usually too many directories for inotify
+					self.output("Watching for changes failed ({0}), polling instead".format(error), error = True)
+					watcher.close()
+					watcher = Watcher.create(os.getcwd(), self.isPruned, options.watchDebounce, True)
+					changes = None
+				if changes is not None and not changes and not outdated:
+					connection.keepAlive()
+					continue
+				try:
+					if changes is None or outdated:
+						self.redeploy()
+					else:
+						self.deployChanges(changes)
+					outdated = False
+				except (ConnectionError, FileNotFoundError, CommandNotSupportedError, BundleError, OSError) + ConnectionPool.connectionErrors as error:
+					self.output("Deploying the changes failed ({0}), retrying".format(error), error = True)
+					outdated = True
+					if self.pool:
+						self.pool.close()
+		finally:
+			watcher.close()
+	
+	def redeploy (self):
+		"""
+		Compare the whole source with the destination again and apply the changes
+		"""
+		self.sourceFiles.clear()
+		self.movedFiles = None
+		self.connection.keepAlive()
+		self.deploy(self.connection, self.options)
+	
+	def deployChanges (self, paths):
+		"""
+		Deploy the changes of given paths (relative to the source directory), comparing them with the source files in memory
+		"""
+		options = self.options
+		sourceFiles = self.sourceFiles[self.algorithm]
+		candidates = set()
+		removed = set()
+		for path in paths:
+			if os.path.isdir(path):
+				if not self.isPruned(path + "/"):
+					candidates.update(name for name, isDir in Source(os.getcwd(), self.isIgnored, self.isPruned).walk(path + "/") if not isDir)
+			elif os.path.isfile(path):
+				if not self.isIgnored(path):
+					candidates.add(path)
+			else:
+				removed.add(path)
+		if options.gitIndex and candidates:
+			try:
+				candidates = GitSource(os.getcwd(), self.isIgnored, self.isPruned).selectFiles(candidates)
+			except GitError as error:
+				self.output("Can't read the git index ({0}), comparing the whole source instead".format(error), error = True)
+				return self.redeploy()
+		prefixes = tuple(path + "/" for path in removed if path not in sourceFiles) # Removed directories
+		redundantFiles = {name for name in removed if name in sourceFiles}
+		if prefixes:
+			redundantFiles.update(name for name in sourceFiles.keys() if name.startswith(prefixes))
+		hasher = Hasher(1, self.algorithm)
+		updatedFiles = {}
+		with self.measure("hash") as phase:
+			phase["files"] += len(candidates)
+			for name in sorted(candidates):
+				try:
+					checksum = hasher.hashFile(name)
+				except IOError: # Removed in the meantime
+					if name in sourceFiles:
+						redundantFiles.add(name)
+					continue
+				if sourceFiles.get(name) != checksum:
+					updatedFiles[name] = checksum
+		if not updatedFiles and not redundantFiles:
+			return
+		self.updatedFiles = FileMap(options.memoryLimit, updatedFiles.items())
+		self.redundantFiles = sorted(redundantFiles)
+		self.movedFiles = {}
+		if options.detectMoves and redundantFiles:
+			removedHashes = {}
+			for name in self.redundantFiles:
+				removedHashes.setdefault(sourceFiles[name], []).append(name)
+			self.detectMoves([name for name in updatedFiles if name not in sourceFiles], removedHashes)
+		self.outputChanges(list(self.updatedFiles.keys()), self.redundantFiles, self.movedFiles)
+		for name, checksum in updatedFiles.items():
+			sourceFiles[name] = checksum
+		for name in redundantFiles:
+			del sourceFiles[name]
+		if not options.dry:
+			try:
+				self.applyChanges(self.destination, sourceFiles, self.algorithm, self.destination.getAlgorithm() != self.algorithm)
+			finally:
+				self.pool.close()
+	
+	def applyChanges (self, destination, sourceFiles, algorithm, rebuild = True):
+		"""
+		Upload the updated files, move, remove and rename files in the destination and update its object list (the whole list
+		is written again if rebuild is set, otherwise the changes are appended to its journal)
+		"""
+		options = self.options
+		updatedFiles = self.updatedFiles
+		redundantFiles = self.redundantFiles
+		movedFiles = self.movedFiles
+		scheduler = self.getScheduler()
+		if updatedFiles: 
+			self.output("Uploading new files...", important = True) 
+			self.transferJournal = self.getTransferJournal()
+			remainingFileNames = scheduler.order(updatedFiles.keys())
+			with self.measure("upload") as phase:
+				phase["files"] = len(remainingFileNames)
+				if options.bundleUrl:
+					remainingFileNames = self.uploadBundles(destination, remainingFileNames)
+				if remainingFileNames:
+					self.uploadFiles(destination, remainingFileNames)
+		if movedFiles:
+			self.output("Moving files...", important = True)
+			with self.measure("move") as phase:
+				phase["files"] = len(movedFiles)
+				self.moveFiles(destination, movedFiles)
+		if redundantFiles: 
+			self.output("Removing redundant files...", important = True) 
+			with self.measure("remove") as phase:
+				phase["files"] = len(redundantFiles)
+				self.removeFiles(destination, redundantFiles)
+		with self.measure("rename") as phase:
+			phase["files"] = len(updatedFiles)
+			self.renameUpdatedFiles(destination, updatedFiles, self.getListener("Renaming successfully uploaded files"), self.pool, scheduler)
+		if self.transferJournal is not None:
+			self.transferJournal.clear()
+		with self.measure("manifest") as phase:
+			phase["files"] = len(sourceFiles)
+			if rebuild:
+				destination.rebuildFileList(sourceFiles, self.getListener("Updating object list"), algorithm)
+			else:
+				destination.updateFileList(sourceFiles, updatedFiles, redundantFiles, self.getListener("Updating object list"), options.journalLimit, movedFiles)
+		if options.enableClean and options.clean:
+			with self.measure("clean"):
 				for item in options.clean:
 					self.output("Cleaning {0}".format(item), important = True)
-					for name, isDir in destination.listDir(item):
-						self.output("Removing {0}".format(name))
-						destination.remove(name, isDir)
-			if options.log:
-				self.log(updatedFiles, redundantFiles)
+					self.cleanDir(destination, item)
+		if options.log:
+			with self.measure("log"):
+				self.log(updatedFiles, redundantFiles, movedFiles)
 	
-	def log (self, updatedFiles, redundantFiles):
+	def log (self, updatedFiles, redundantFiles, movedFiles = None):
 		"""
-		Log changes to a file in the destination
+		Log changes to a file in the destination (only the new entry is sent if the server can append to files)
 		"""
-		with io.StringIO() as logFile:
-			self.output("Logging changes...", important = True)
+		self.output("Logging changes...", important = True)
+		date = time.strftime("%d/%b/%Y %H:%M", time.gmtime())
+		changeList = []
+		if updatedFiles:
+			changeList.append("\t" + "Updated Files:")
+			for fileName in updatedFiles.keys():
+				changeList.append("\t\t" + fileName)
+		if redundantFiles:
+			changeList.append("\t" + "Removed Files:")
+			for fileName in redundantFiles:
+				changeList.append("\t\t" + fileName)
+		if movedFiles:
+			changeList.append("\t" + "Moved Files:")
+			for fileName in sorted(movedFiles):
+				changeList.append("\t\t{0} -> {1}".format(movedFiles[fileName], fileName))
+		entry = "[{0}]\n{1}\n".format(date, "\n".join(changeList)).encode("utf-8")
+		if self.options.logRotateSize:
+			size = self.connection.getSize(self.options.logFile)
+			if size and size + len(entry) > self.options.logRotateSize:
+				self.rotateLog()
+		with io.BytesIO(entry) as logFile:
+			try:
+				self.connection.append(logFile, self.options.logFile)
+			except CommandNotSupportedError:
+				self.rewriteLog(entry)
+	
+	def rewriteLog (self, entry):
+		"""
+		Append an entry to the log file by downloading it and uploading it again (for servers that can't append to files)
+		"""
+		with io.BytesIO() as logFile:
 			try:
 				self.connection.download(self.options.logFile, logFile)
-				logFile.read() # We want to append to the log file
+				logFile.seek(0, io.SEEK_END) # We want to append to the log file
 			except FileNotFoundError:
 				pass
-			date = time.strftime("%d/%b/%Y %H:%M", time.gmtime())
-			changeList = []
-			if updatedFiles:
-				changeList.append("\t" + "Updated Files:")
-				for fileName in sorted(updatedFiles.keys()):
-					changeList.append("\t\t" + fileName)
-			if redundantFiles:
-				changeList.append("\t" + "Removed Files:")
-				for fileName in redundantFiles:
-					changeList.append("\t\t" + fileName)
-			logFile.write("[{0}]\n{1}\n".format(date, "\n".join(changeList)))
+			logFile.write(entry)
 			self.connection.upload(logFile, self.options.logFile, safe = True)
 	
+	def rotateLog (self):
+		"""
+		Shift the log files (deployer.log becomes deployer.log.1 and so on), dropping the oldest one
+		"""
+		logFile = self.options.logFile
+		count = max(1, self.options.logRotateCount)
+		try:
+			self.connection.remove("{0}.{1}".format(logFile, count))
+		except FileNotFoundError:
+			pass
+		for number in range(count - 1, 0, -1):
+			try:
+				self.connection.rename("{0}.{1}".format(logFile, number), "{0}.{1}".format(logFile, number + 1))
+			except FileNotFoundError:
+				pass
+		self.connection.rename(logFile, logFile + ".1")
+	
 	def output (self, message, important = False, error = False, breakLine = True):
 		"""
 		Output a message on the screen
@@ -191,6 +762,17 @@ class Deployer:
 		else:
 			return None
 	
+	def getGroupListener (self, message, count):
+		"""
+		Get a progress listener showing the overall progress of given number of transfers
+		"""
+		if self.frontend:
+			listener = self.frontend.getGroupListener(count)
+			listener.setMessage(message)
+			return listener
+		else:
+			return None
+	
 	def confirm (self, question):
 		"""
 		Ask for confirmation by user
@@ -203,6 +785,8 @@ class Deployer:
 		"""
 		Stop the deployer from running and terminate it
 		"""
+		if self.pool:
+			self.pool.close()
 		self.connection.disconnect()
 		self.output("Deployer aborted", important = True)
 		sys.exit(1)
@@ -211,72 +795,253 @@ class Source:
 	"""
 	A representation of the local directory to be deployed
 	"""
+	algorithm = Hasher.algorithm
 	
-	def __init__ (self, path = None):
+	def __init__ (self, path = None, isIgnored = None, isPruned = None, algorithm = None):
 		"""
-		Set up the source object, get a list of available files
+		Set up the source object (isIgnored and isPruned decide which files are left out and which directories aren't scanned)
 		"""
-		self.files = []
-		self.dirs = []
-		self.scanFiles(path)
+		self.path = path or os.getcwd()
+		self.isIgnored = isIgnored or (lambda fileName: False)
+		self.isPruned = isPruned or (lambda dirName: False)
+		self.algorithm = algorithm or self.algorithm
 	
-	def scanFiles (self, path = None):
+	def walk (self, start = ""):
 		"""
-		Scan the source directory for available files
+		A generator of (Path relative to the source directory, is a directory) tuples, skipping pruned directories
 		"""
-		result = []
-		subdirs = []
-		if path is None:
-			path = os.getcwd()
-		for item in os.listdir(path):
-			itemPath = os.path.join(path, item) if path != os.getcwd() else item
-			if os.path.isdir(itemPath):
-				subdirs.append(itemPath)
-			else:
-				result.append(itemPath)
-		for subdir in subdirs:
-			self.dirs.append(subdir + "/")
-			self.scanFiles(subdir)
-		self.files += result
+		pending = [start]
+		while pending:
+			directory = pending.pop()
+			try:
+				entries = os.scandir(os.path.join(self.path, directory) if directory else self.path)
+			except OSError:
+				continue
+			with entries:
+				for entry in entries:
+					itemPath = directory + entry.name
+					try:
+						isDir = entry.is_dir()
+					except OSError:
+						isDir = False
+					if isDir:
+						if not self.isPruned(itemPath + "/"):
+							pending.append(itemPath + "/")
+							yield (itemPath + "/", True)
+					elif not self.isIgnored(itemPath):
+						yield (itemPath, False)
 	
-	def getFiles (self):
+	def scanFiles (self):
 		"""
-		A generator of (File name, File's hash) tuples
+		A generator of names of the files available in the source directory
 		"""
-		import hashlib
-		for fileName in self.files:
-			try:
-				yield (fileName, hashlib.sha1(open(fileName, "rb").read()).hexdigest())
-			except IOError:
-				pass
-			
+		for itemPath, isDir in self.walk():
+			if not isDir:
+				yield itemPath
+	
+	def getFiles (self, cache = None, hasher = None):
+		"""
+		A generator of (File name, File's hash) tuples (hashes of unchanged files are taken from the cache if one is given)
+		"""
+		if hasher is None:
+			hasher = Hasher(1, self.algorithm)
+		stats = {} # Stats of files taken from the scan whose hashes haven't been yielded yet
+		def scan ():
+			for fileName in self.scanFiles():
+				try:
+					stats[fileName] = os.stat(os.path.join(self.path, fileName))
+				except OSError:
+					continue
+				yield fileName
+		def getCachedHash (fileName):
+			checksum = cache.get(fileName, stats[fileName])
+			if checksum is not None:
+				del stats[fileName]
+			return checksum
+		for fileName, checksum in hasher.hashFiles(scan(), getCachedHash if cache is not None else None):
+			fileStat = stats.pop(fileName, None)
+			if cache is not None and fileStat is not None: # Hashed rather than taken from the cache
+				cache.set(fileName, fileStat, checksum)
+			yield (fileName, checksum)
+	
 	def getDirs (self):
 		"""
-		Get a list of subdirectories in the source
+		A generator of subdirectories in the source
+		"""
+		for itemPath, isDir in self.walk():
+			if isDir:
+				yield itemPath
+
+class GitSource (Source):
+	"""
+	A local directory in a git working tree whose files are listed by the git index (untracked files that aren't ignored by
+	.gitignore included), so that the object IDs of clean files can be reused and only files changed in the working tree are hashed
+	"""
+	algorithm = "sha1-git"
+	regularModes = (b"100644", b"100755")
+	
+	def __init__ (self, path = None, isIgnored = None, isPruned = None, algorithm = None):
+		"""
+		Set up the source object, making sure the directory is in a git working tree
+		"""
+		super().__init__(path, isIgnored, isPruned, algorithm)
+		self.git("rev-parse", "--git-dir")
+		self.prunedDirs = {}
+	
+	def git (self, *arguments):
+		"""
+		Run a git command in the source directory and get its output
+		"""
+		try:
+			return subprocess.run(("git",) + arguments, cwd = self.path, stdout = subprocess.PIPE, stderr = subprocess.PIPE, check = True).stdout
+		except OSError as error:
+			raise GitError(str(error))
+		except subprocess.CalledProcessError as error:
+			raise GitError(error.stderr.decode("utf-8", "replace").strip() or str(error))
+	
+	def listFiles (self, *arguments):
+		"""
+		Get a list of entries printed by git ls-files with given arguments (paths are relative to the source directory)
+		"""
+		return [os.fsdecode(entry) for entry in self.git("ls-files", "-z", *arguments).split(b"\0") if entry]
+	
+	def selectFiles (self, fileNames, chunkSize = 1000):
+		"""
+		Get a set of given files that belong to the source, i.e. that are tracked or untracked but not ignored by .gitignore
+		"""
+		fileNames = sorted(fileNames)
+		selected = set()
+		for start in range(0, len(fileNames), chunkSize): # Keeps the command line short
+			chunk = fileNames[start:start + chunkSize]
+			selected.update(os.fsdecode(entry) for entry in self.git("--literal-pathspecs", "ls-files", "-z", "--cached", "--others", "--exclude-standard", "--", *chunk).split(b"\0") if entry)
+		return selected & set(fileNames)
+	
+	def isInPrunedDir (self, path):
+		"""
+		Check if a path lies in a pruned directory (a path with a trailing slash is checked as a directory itself)
+		"""
+		position = path.find("/")
+		while position >= 0:
+			dirName = path[:position + 1]
+			if dirName not in self.prunedDirs:
+				self.prunedDirs[dirName] = self.isPruned(dirName)
+			if self.prunedDirs[dirName]:
+				return True
+			position = path.find("/", position + 1)
+		return False
+	
+	def isIncluded (self, fileName):
+		"""
+		Check that a file isn't ignored and doesn't lie in a pruned directory
+		"""
+		return not self.isInPrunedDir(fileName) and not self.isIgnored(fileName)
+	
+	def getIndex (self):
+		"""
+		Get a file name: object ID dictionary of regular files in the index that are clean in the working tree and a list of other
+		files that have to be scanned and hashed (untracked files, changed files, symlinks, submodules and unmerged files)
+		"""
+		try:
+			self.git("update-index", "-q", "--refresh") # Let git update its stat cache so that merely touched files aren't dirty
+		except GitError:
+			pass
+		index = {}
+		other = set(self.listFiles("--others", "--exclude-standard"))
+		for entry in self.listFiles("--stage"):
+			info, _, fileName = entry.partition("\t")
+			mode, objectId, stage = info.split()
+			if mode.encode("ascii") in self.regularModes and stage == "0":
+				index[fileName] = objectId
+			else:
+				other.add(fileName)
+		for fileName in self.listFiles("--modified"):
+			if index.pop(fileName, None) is not None:
+				other.add(fileName)
+		for fileName in other:
+			index.pop(fileName, None)
+		return index, sorted(other)
+	
+	def scanFiles (self):
+		"""
+		A generator of names of the files available in the source directory
 		"""
-		return self.dirs
+		index, other = self.getIndex()
+		yield from (fileName for fileName in index if self.isIncluded(fileName))
+		for fileName in other:
+			yield from self.scanOther(fileName)
+	
+	def scanOther (self, fileName):
+		"""
+		A generator of names of files that git doesn't track as regular files (directories such as submodules are walked)
+		"""
+		fileName = fileName.rstrip("/") # Nested repositories are listed as directories
+		if os.path.isdir(os.path.join(self.path, fileName)):
+			if not self.isInPrunedDir(fileName + "/"):
+				for itemPath, isDir in self.walk(fileName + "/"):
+					if not isDir:
+						yield itemPath
+		elif os.path.lexists(os.path.join(self.path, fileName)) and self.isIncluded(fileName):
+			yield fileName
+	
+	def getFiles (self, cache = None, hasher = None):
+		"""
+		A generator of (File name, File's git object ID) tuples (only files git doesn't know to be clean are hashed, the cache is unused)
+		Files are hashed as usual if another algorithm was requested
+		"""
+		if self.algorithm != GitSource.algorithm:
+			yield from super().getFiles(cache, hasher)
+			return
+		if hasher is None:
+			hasher = Hasher(1, self.algorithm)
+		index, other = self.getIndex()
+		for fileName, objectId in index.items():
+			if self.isIncluded(fileName):
+				yield (fileName, objectId)
+		pending = (itemPath for fileName in other for itemPath in self.scanOther(fileName))
+		yield from hasher.hashFiles(pending)
 
 class Destination:
 	"""
 	An object representation of the deployment's destination
 	"""
-	def __init__ (self, connection):
+	def __init__ (self, connection, memoryLimit = None, cache = None):
 		"""
 		Set up the destination object
 		"""
 		self.connection = connection
+		self.memoryLimit = memoryLimit
+		self.cache = cache
 		self.files = None
 	
+	def load (self, listener = None):
+		"""
+		Download the information about the files in the destination (unless it is already loaded)
+		"""
+		if self.files is None:
+			self.files = DestinationInfo(self.connection, listener = listener, memoryLimit = self.memoryLimit, cache = self.cache)
+	
 	def getFiles (self, listener = None):
-		if not self.files:
-			self.files = DestinationInfo(self.connection, listener = listener)
+		self.load(listener)
 		return self.files.getNames()
 	
+	def getItems (self):
+		"""
+		Get a generator of (File name, File's hash) tuples of files present in the destination, sorted by the file name
+		"""
+		self.load()
+		return self.files.getItems()
+	
 	def listDir (self, path):
 		"""
 		List a directory (WARNING: lists the actual contents of the directory, regardless of the objects file)
 		"""
-		return {k: v for k, v in self.connection.ls(path) if k not in (".", "..")}.items()
+		return list(self.connection.ls(path))
+	
+	def walkDir (self, path):
+		"""
+		List a directory recursively as (name, isDir) tuples, parents before their contents (WARNING: lists the actual contents, regardless of the objects file)
+		"""
+		return list(self.connection.walk(path))
 	
 	def download (self, path, fileName, listener = None):
 		"""
@@ -297,38 +1062,115 @@ class Destination:
 		self.connection.mkdir(path)
 		self.connection.chmod(path, perms)
 	
-	def upload (self, path, fileName = None, rename = False, listener = None):
+	def upload (self, path, fileName = None, rename = False, listener = None, connection = None, resume = False, onOpen = None):
 		"""
-		Upload a file to the destination
+		Upload a file to the destination (using given connection instead of the default one, if there is one)
+		If resume is set, a partial upload of the file left in the destination is completed (onOpen is called when the transfer starts)
 		"""
+		connection = connection or self.connection
 		if fileName is None:
 			fileName = path
 		with open(path, "rb") as sourceFile:
-			self.connection.upload(sourceFile, fileName, safe = True, rename = rename, listener = listener)
+			connection.upload(sourceFile, fileName, safe = True, rename = rename, listener = listener, resume = resume, onOpen = onOpen)
 		fileStat = os.stat(path)
 		perms = oct(fileStat.st_mode & 0o777).split("o")[1]
-		self.connection.chmod(self.connection.getSafeFilename(path) if not rename else path, perms)
+		connection.chmod(connection.getSafeFilename(path) if not rename else path, perms)
+	
+	def isStaged (self, path, connection = None):
+		"""
+		Check if a file has been completely uploaded to the destination under its temporary name
+		"""
+		connection = connection or self.connection
+		try:
+			return connection.getSize(connection.getSafeFilename(path)) == os.path.getsize(path)
+		except OSError:
+			return False
 	
-	def rename (self, original, new):
+	def move (self, original, new, connection = None):
+		"""
+		Move a file to another place in the destination, keeping the permissions of the local file
+		"""
+		connection = connection or self.connection
+		connection.prepareParent(new)
+		connection.rename(original, new)
+		perms = oct(os.stat(new).st_mode & 0o777).split("o")[1]
+		connection.chmod(new, perms)
+	
+	def rename (self, original, new, connection = None):
 		"""
 		Rename a file in the destination
 		"""
-		self.connection.rename(original, new)
+		(connection or self.connection).rename(original, new)
 	
-	def remove (self, fileName, isDir = False):
+	def remove (self, fileName, isDir = False, connection = None):
 		"""
 		Remove a file from the destination
 		"""
 		try:
-			self.connection.remove(fileName, isDir)
+			(connection or self.connection).remove(fileName, isDir)
+		except FileNotFoundError:
+			pass
+	
+	def rmdir (self, path):
+		"""
+		Remove an empty directory from the destination
+		"""
+		try:
+			self.connection.rmdir(path)
 		except FileNotFoundError:
 			pass
 	
-	def rebuildFileList (self, sourceFiles, listener = None):
+	def rebuildFileList (self, sourceFiles, listener = None, algorithm = None):
+		"""
+		Parse the list of source files (with hashes of given algorithm) into a new destination info file
+		"""
+		self.files.rebuild(sourceFiles, listener, algorithm)
+	
+	def updateFileList (self, sourceFiles, updatedFiles, redundantFiles, listener = None, journalLimit = None, movedFiles = None):
+		"""
+		Record the changes in the journal of the destination info file (the whole file is rebuilt once the journal grows too large)
+		"""
+		self.files.update(sourceFiles, updatedFiles, redundantFiles, listener, journalLimit, movedFiles)
+	
+	def getAlgorithm (self):
 		"""
-		Parse the list of source files into a new destination info file
+		Get the hash algorithm used by the destination info file (None if there is no such file yet)
 		"""
-		self.files.rebuild(sourceFiles, listener)
+		return self.files.getAlgorithm()
+	
+	def getUpdateTime (self):
+		"""
+		Get the modification time of the destination info file or its journal, whichever is newer, in the MDTM format
+		(None if it isn't known)
+		"""
+		times = []
+		for fileName in (self.files.objectsFileName, self.files.journalFileName):
+			stamp = self.connection.getStamp(fileName)
+			if stamp is not None and stamp[1] is not None:
+				times.append(stamp[1])
+		return max(times) if times else None
+	
+	def getStamp (self, fileName, connection = None):
+		"""
+		Get a (size, modification time) tuple of a file in the destination (None if it's missing)
+		"""
+		return (connection or self.connection).getStamp(fileName)
+	
+	def getRemoteHash (self, fileName, algorithm, connection = None):
+		"""
+		Get the hash of a file in the destination computed by the server (None if the file is missing)
+		Raises CommandNotSupportedError if the server can't compute hashes and HashError if it refuses to hash this file
+		"""
+		try:
+			return (connection or self.connection).getHash(fileName, algorithm)
+		except FileNotFoundError:
+			return None
+	
+	def forget (self, fileName):
+		"""
+		Remove a file from the destination info (so that it gets uploaded again)
+		"""
+		self.files.setFile(fileName, None)
 	
 	def hasFile (self, fileName, checksum = None):
 		"""
@@ -348,24 +1190,79 @@ class DestinationInfo:
 	"""
 	An object representation of the file contatining the information about the destination
 	"""
+	spoolSize = 4 * 1024 * 1024 # Larger objects files are downloaded to a temporary file instead of the memory
 	
-	def __init__ (self, connection, objectsFileName = ".objects", listener = None):
+	def __init__ (self, connection, objectsFileName = ".objects", listener = None, memoryLimit = None, cache = None):
 		"""
-		Try to download the destination information file from the server and parse it
+		Try to download the destination information file from the server (or take it from the cache) and parse it
+		Raises ManifestError if the file is damaged or written by a newer version
 		"""
-		self.files = {}
+		self.files = FileMap(memoryLimit)
+		self.details = FileMap(memoryLimit)
 		self.connection = connection
+		self.cache = cache
 		self.objectsFileName = objectsFileName
-		with io.StringIO() as objectsFile:
+		self.journalFileName = objectsFileName + ".journal"
+		self.journalSize = None
+		self.journalDamaged = False
+		self.manifest = Manifest()
+		with tempfile.SpooledTemporaryFile(self.spoolSize) as objectsFile:
 			try:
-				connection.download(objectsFileName, objectsFile, listener = listener)
-				if objectsFile.read().find(':') >= 0:
-					objectsFile.seek(0)
-					for line in objectsFile:
-						(objectName, objectHash) = line.split(":")
-						self.files[objectName.strip()] = objectHash.strip()
+				self.fetch(objectsFileName, objectsFile, listener)
+				for objectName, objectHash, details in self.manifest.read(objectsFile):
+					self.setFile(objectName, objectHash, details)
 			except FileNotFoundError:
 				pass
+			except (ValueError, EOFError, zlib.error, gzip.BadGzipFile) as error:
+				raise ManifestError("Can't read the {0} file in the destination: {1}".format(objectsFileName, str(error) or type(error).__name__))
+		if self.manifest.fileVersion is not None and self.manifest.fileVersion >= Manifest.version:
+			self.loadJournal()
+	
+	def loadJournal (self):
+		"""
+		Download the journal of changes made since the destination information file was written and replay it
+		"""
+		with tempfile.SpooledTemporaryFile(self.spoolSize) as journalFile:
+			try:
+				self.fetch(self.journalFileName, journalFile)
+			except FileNotFoundError:
+				return
+			self.journalSize = journalFile.seek(0, io.SEEK_END)
+			journalFile.seek(0)
+			try:
+				for objectName, objectHash, details in self.manifest.readJournal(journalFile):
+					self.setFile(objectName, objectHash, details)
+			except (EOFError, ValueError, zlib.error): # An interrupted append, the changes read so far are still valid
+				self.journalDamaged = True
+	
+	def fetch (self, remoteName, stream, listener = None):
+		"""
+		Download a file from the destination into a binary stream, using the local copy if the file hasn't changed on the server
+		"""
+		if self.cache is None:
+			return self.connection.download(remoteName, stream, listener)
+		stamp = self.connection.getStamp(remoteName)
+		if stamp is None:
+			self.cache.remove(remoteName)
+			raise FileNotFoundError
+		if self.cache.load(remoteName, stamp, stream):
+			return
+		self.connection.download(remoteName, stream, listener, size = stamp[0])
+		self.cache.store(remoteName, stamp, stream)
+	
+	def setFile (self, fileName, checksum, details = None):
+		"""
+		Record a file (None as the hash means the file has been removed)
+		"""
+		if checksum is None:
+			if fileName in self.files:
+				del self.files[fileName]
+			if fileName in self.details:
+				del self.details[fileName]
+			return
+		self.files[fileName] = checksum
+		if details:
+			self.details[fileName] = "{0}:{1}:{2}".format(*details)
 	
 	def __getitem__ (self, fileName):
 		"""
@@ -379,39 +1276,121 @@ class DestinationInfo:
 		"""
 		return key in self.files
 	
+	def getDetails (self, fileName):
+		"""
+		Get a (size, mode, mtime) tuple of a file as recorded in the objects file (None for files listed in the legacy format)
+		"""
+		details = self.details.get(fileName)
+		return tuple(int(value) for value in details.split(":")) if details else None
+	
 	def getNames (self):
 		"""
 		Get a list of files present in the destination
 		"""
 		return list(self.files.keys())
 	
-	def rebuild (self, sourceFiles, listener = None):
+	def getItems (self):
 		"""
-		Create a new destination information file and upload it to the destination
+		Get a generator of (File name, File's hash) tuples sorted by the file name
+		"""
+		return self.files.items()
+	
+	def getAlgorithm (self):
 		"""
-		with io.StringIO() as objectsFile:
-			objectsFile.write("\n".join(["{0}: {1}".format(fileName, fileSum) for fileName, fileSum in sourceFiles.items()]))
+		Get the hash algorithm the destination information file was written with (None if there is no such file)
+		"""
+		return self.manifest.algorithm if self.manifest.fileVersion is not None else None
+	
+	def rebuild (self, sourceFiles, listener = None, algorithm = None):
+		"""
+		Create a new destination information file and upload it to the destination (files in the legacy format are migrated this way)
+		"""
+		manifest = Manifest(algorithm or self.manifest.algorithm)
+		with tempfile.SpooledTemporaryFile(self.spoolSize) as objectsFile:
+			manifest.write(objectsFile, ((fileName, fileSum, self.getLocalDetails(fileName)) for fileName, fileSum in sourceFiles.items()))
 			self.connection.upload(objectsFile, self.objectsFileName, safe = True, listener = listener)
+			if self.cache is not None:
+				self.cache.store(self.objectsFileName, self.connection.getStamp(self.objectsFileName), objectsFile)
+		self.manifest = manifest
+		self.manifest.fileVersion = Manifest.version
+		if self.journalSize is not None: # The journal has been folded into the new file
+			try:
+				self.connection.remove(self.journalFileName)
+			except FileNotFoundError:
+				pass
+			if self.cache is not None:
+				self.cache.remove(self.journalFileName)
+			self.journalSize = None
+			self.journalDamaged = False
+	
+	def update (self, sourceFiles, updatedFiles, redundantFiles, listener = None, journalLimit = None, movedFiles = None):
+		"""
+		Append the changes to the journal, rebuilding the whole destination information file instead if the journal is too large,
+		damaged or can't be appended to
+		"""
+		changes = [(fileName, fileSum, self.getLocalDetails(fileName)) for fileName, fileSum in updatedFiles.items()]
+		changes += [(fileName, None, None) for fileName in redundantFiles]
+		if movedFiles:
+			changes += [(fileName, None, None) for fileName in movedFiles.values()]
+			changes += [(fileName, sourceFiles[fileName], self.getLocalDetails(fileName)) for fileName in movedFiles]
+		for fileName, fileSum, details in changes:
+			self.setFile(fileName, fileSum, details)
+		if self.manifest.fileVersion is None or self.manifest.fileVersion < Manifest.version or self.journalDamaged:
+			return self.rebuild(sourceFiles, listener)
+		with tempfile.SpooledTemporaryFile(self.spoolSize) as journalFile:
+			self.manifest.writeJournal(journalFile, changes)
+			size = journalFile.tell()
+			if journalLimit is not None and (self.journalSize or 0) + size > journalLimit:
+				return self.rebuild(sourceFiles, listener)
+			try:
+				self.connection.append(journalFile, self.journalFileName, listener = listener)
+			except CommandNotSupportedError:
+				return self.rebuild(sourceFiles, listener)
+			if self.cache is not None:
+				stamp = self.connection.getStamp(self.journalFileName)
+				if self.journalSize is None:
+					self.cache.store(self.journalFileName, stamp, journalFile)
+				else:
+					self.cache.append(self.journalFileName, stamp, journalFile)
+		self.journalSize = (self.journalSize or 0) + size
+	
+	def getLocalDetails (self, fileName):
+		"""
+		Get a (size, mode, mtime) tuple of a local file
+		"""
+		try:
+			fileStat = os.stat(fileName)
+		except OSError:
+			return None
+		return (fileStat.st_size, fileStat.st_mode & 0o777, int(fileStat.st_mtime))
 
 if __name__ == "__main__":
-	from FTPConnection import FTPConnection
 	from Options import *
 	try:
 		args = ArgumentOptionsParser().load()
 		options = ConfigOptionsParser().load(args.configFile, args.section)
 		options += args
-		if options.quiet:
-			deployer = Deployer()
-		else:
+		frontend = None
+		if not options.quiet:
 			from ConsoleFrontend import ConsoleFrontend
-			deployer = Deployer(ConsoleFrontend())
+			frontend = ConsoleFrontend()
+		deployer = Deployer(frontend)
 		if options.generateObjects:
 			deployer.generateObjects(options)
+		elif options.targets:
+			if options.watch:
+				deployer.output("Watching can't be combined with deploying to several targets", error = True)
+				sys.exit(1)
+			from FanOut import FanOut
+			deployer = FanOut(frontend)
+			if not deployer.run(args, options.targets):
+				sys.exit(1)
 		else:
-			connection = FTPConnection(options.host, options.username, options.password, options.path)
-			deployer.run(connection, options)
+			deployer.run(deployer.connect(options), options)
 	except KeyboardInterrupt:
 		deployer.interrupt()
-	except ConnectionError as error:
+	except (ConnectionError, ManifestError) as error:
 		deployer.output(str(error), error = True)
 		sys.exit(1)
+	except OptionError as error: # Options are checked before there is a frontend to report it
+		sys.exit("Error: {0}".format(error))
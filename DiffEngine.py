@@ -0,0 +1,41 @@
+class DiffEngine:
+	"""
+	Compares the source with the destination in a single pass over their sorted file lists
+	"""
+	added = "added"
+	modified = "modified"
+	removed = "removed"
+	unchanged = "unchanged"
+	
+	def diff (self, sourceItems, destinationItems):
+		"""
+		A generator of (File name, status, source hash, destination hash) tuples
+		Both arguments have to be iterables of (File name, File's hash) tuples sorted by the file name
+		"""
+		source = self.checkOrder(sourceItems)
+		destination = self.checkOrder(destinationItems)
+		sourceItem = next(source, None)
+		destinationItem = next(destination, None)
+		while sourceItem is not None or destinationItem is not None:
+			if destinationItem is None or (sourceItem is not None and sourceItem[0] < destinationItem[0]):
+				yield (sourceItem[0], self.added, sourceItem[1], None)
+				sourceItem = next(source, None)
+			elif sourceItem is None or destinationItem[0] < sourceItem[0]:
+				yield (destinationItem[0], self.removed, None, destinationItem[1])
+				destinationItem = next(destination, None)
+			else:
+				status = self.unchanged if sourceItem[1] == destinationItem[1] else self.modified
+				yield (sourceItem[0], status, sourceItem[1], destinationItem[1])
+				sourceItem = next(source, None)
+				destinationItem = next(destination, None)
+	
+	def checkOrder (self, items):
+		"""
+		Pass the items through, making sure they really are sorted
+		"""
+		previous = None
+		for item in items:
+			if previous is not None and item[0] <= previous:
+				raise ValueError("File list is not sorted: {0} follows {1}".format(item[0], previous))
+			previous = item[0]
+			yield item
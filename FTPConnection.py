@@ -1,27 +1,70 @@
-import ftplib, socket, os
-from exceptions import FileNotFoundError, ConnectionError
+import ftplib, socket, os, io, time, codecs, zlib
+from exceptions import FileNotFoundError, ConnectionError, CommandNotSupportedError, HashError
+from Transport import Transport
 
-class FTPConnection:
+class InstrumentedFTP (ftplib.FTP):
+	"""
+	An FTP client that counts the commands it sends and the time spent waiting for their first replies in given connection
+	"""
+	
+	def __init__ (self, connection):
+		super().__init__()
+		self.connection = connection
+		self.commandSent = None
+	
+	def putcmd (self, line):
+		self.connection.commands += 1
+		self.commandSent = time.perf_counter()
+		super().putcmd(line)
+	
+	def getresp (self):
+		try:
+			return super().getresp()
+		finally:
+			if self.commandSent is not None: # Later replies (e.g. at the end of a transfer) don't measure the latency
+				self.connection.replyTime += time.perf_counter() - self.commandSent
+				self.commandSent = None
+
+class FTPConnection (Transport):
 	"""
 	An FTP object envelope
 	"""
 	root = "/"
-	bufferSize = 4096
+	bufferSize = 65536
+	compressionLevel = None # Transfers are compressed (using MODE Z) only if a level is set
+	# Hash algorithms (named as in hashlib) with their names for the HASH command and their older X commands, in order of preference
+	hashCommands = (("sha1", "SHA-1", "XSHA1"), ("sha256", "SHA-256", "XSHA256"), ("sha512", "SHA-512", "XSHA512"), ("md5", "MD5", "XMD5"), ("crc32", "CRC32", "XCRC"))
+	# Files that are already compressed, sending them through MODE Z would only waste time
+	uncompressedExtensions = ("png", "jpg", "jpeg", "gif", "webp", "avif", "ico", "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "jar", "woff", "woff2", "mp3", "mp4", "ogg", "webm", "pdf")
+	uploadRetries = 2 # Times an upload is tried again after the connection has broken
 	
-	def __init__ (self, host, username, password, root = None):
+	def __init__ (self, host, username, password, root = None, bufferSize = None, port = 21):
 		"""
 		Set up the connection
 		"""
 		self.host = host
+		self.port = port
 		self.username = username
 		self.password = password
 		self.root = root
+		if bufferSize:
+			self.bufferSize = bufferSize
+		self.knownDirs = set()
+		self.roundTripsSaved = 0
+		self.mlsdSupported = True
+		self.mlstSupported = True
+		self.features = None
+		self.bytesSaved = 0
+		self.bytesSent = 0
+		self.bytesReceived = 0
+		self.commands = 0
+		self.replyTime = 0
 		self.connect()
 	
 	def connect (self):
-		ftp = self.ftp = ftplib.FTP()
+		ftp = self.ftp = InstrumentedFTP(self)
 		try:
-			ftp.connect(self.host)
+			ftp.connect(self.host, self.port)
 		except socket.error:
 			raise ConnectionError("Connecting to FTP server failed")
 		try:
@@ -29,11 +72,56 @@ class FTPConnection:
 		except ftplib.error_perm:
 			raise ConnectionError("Authentication failed")
 		
+		self.transferType = None
+		self.transferMode = "S"
+		self.hashAlgorithm = None # The algorithm selected for HASH
 		if self.root:
 			if not self.root.startswith("/"):
 				self.root = "/" + self.root
-			self.cd(self.root)
-			self.cdRoot()
+			try:
+				self.cdRoot()
+			except ftplib.error_perm:
+				self.mkdir(self.root)
+				self.cdRoot()
+		else:
+			self.root = ftp.pwd()
+	
+	def reconnect (self):
+		"""
+		Drop the current control connection and log in again
+		"""
+		try:
+			self.ftp.close()
+		except ftplib.all_errors:
+			pass
+		self.connect()
+	
+	def keepAlive (self):
+		"""
+		Send a NOOP, logging in again if the server has closed the connection
+		"""
+		try:
+			self.ftp.voidcmd("NOOP")
+		except ftplib.all_errors:
+			self.reconnect()
+	
+	def clone (self):
+		"""
+		Open another connection to the same server
+		"""
+		connection = type(self)(self.host, self.username, self.password, self.root, self.bufferSize, self.port)
+		connection.setCompression(self.compressionLevel, self.uncompressedExtensions)
+		connection.setBandwidthLimit(self.bandwidthLimit)
+		return connection
+	
+	def setCompression (self, level, uncompressedExtensions = None):
+		"""
+		Compress transfers of files (except ones with given extensions) with given zlib level if the server supports MODE Z
+		(None as the level disables the compression)
+		"""
+		self.compressionLevel = level
+		if uncompressedExtensions is not None:
+			self.uncompressedExtensions = tuple(extension.lower().lstrip(".") for extension in uncompressedExtensions)
 	
 	def disconnect (self):
 		"""
@@ -58,157 +146,512 @@ class FTPConnection:
 			self.ftp.cwd(path)
 	
 	def isDir (self, path):
-		current = self.ftp.pwd()
-		
+		"""
+		Check if given path (relative to the root) is a directory
+		"""
+		if self.normalizePath(path) in self.knownDirs:
+			self.roundTripsSaved += 3
+			return True
+		self.roundTripsSaved += 1 # The working directory is always the root, no need to ask for it
 		try:
 			self.ftp.cwd(path)
-			self.ftp.cwd(current)
-			return True
 		except ftplib.error_perm:
-			self.ftp.cwd(current)
 			return False
+		self.knownDirs.add(self.normalizePath(path))
+		self.cdRoot()
+		return True
 	
-	def ls (self, path = None):
+	def listDetailed (self, path = None):
 		"""
-		List a directory
+		List a directory with one command, yielding (name, facts) tuples (facts always contain the type of the entry)
 		"""
-		if not path:
-			path = self.root
-		if not path.endswith('/'):
-			path += '/'
-		for filename in self.ftp.nlst(path):
-			yield (filename, self.isDir(filename))
+		path = self.normalizePath(path or "")
+		prefix = path + "/" if path and path != "/" else ""
+		entries = None
+		self.setMode("S")
+		if self.mlsdSupported:
+			try:
+				self.transferType = "A" # mlsd() goes through retrlines(), which switches to ASCII transfers
+				entries = [(name, facts) for name, facts in self.ftp.mlsd(path) if facts.get("type") not in ("cdir", "pdir")]
+			except ftplib.error_perm as error:
+				if not str(error).startswith(("500", "501", "502", "504")):
+					raise FileNotFoundError
+				self.mlsdSupported = False
+		if entries is None:
+			lines = []
+			try:
+				self.transferType = "A" # retrlines() switches to ASCII transfers
+				self.ftp.retrlines("LIST {0}".format(path) if path else "LIST", lines.append)
+			except ftplib.error_perm:
+				raise FileNotFoundError
+			entries = [entry for entry in map(self.parseListLine, lines) if entry]
+		for name, facts in entries:
+			if name in (".", ".."):
+				continue
+			if facts["type"] == "dir":
+				self.knownDirs.add(prefix + name)
+			yield (prefix + name, facts)
+	
+	def parseListLine (self, line):
+		"""
+		Parse a line of a Unix or DOS style LIST response into a (name, facts) tuple (None if the line doesn't describe a file)
+		"""
+		parts = line.split(None, 8)
+		if len(parts) == 9 and parts[0][0] in "-dl":
+			name = parts[8]
+			if parts[0][0] == "l":
+				return (name.split(" -> ")[0], {"type": "link", "size": parts[4]})
+			return (name, {"type": "dir" if parts[0][0] == "d" else "file", "size": parts[4]})
+		parts = line.split(None, 3)
+		if len(parts) == 4 and parts[2] == "<DIR>":
+			return (parts[3], {"type": "dir"})
+		if len(parts) == 4 and parts[2].isdigit():
+			return (parts[3], {"type": "file", "size": parts[2]})
+		return None
 	
 	def mkdir (self, path):
 		"""
-		Make a directory on the server
+		Make a directory and all its missing parents on the server (without changing the working directory)
 		"""
-		path = path.strip("/")
-		diff = path.split("/")
-		self.cdRoot()
-		existing = True
-		for directory in diff:
-			if directory:
-				if existing:
-					try:
-						self.ftp.cwd(directory)
-					except ftplib.error_perm:
-						existing = False
-						self.ftp.mkd(directory)
-						self.ftp.cwd(directory)
-				else:
-					self.ftp.mkd(directory)
-					self.ftp.cwd(directory)
-		self.cdRoot()
+		path = self.normalizePath(path)
+		if not path or path == "/":
+			return
+		if path in self.knownDirs:
+			self.roundTripsSaved += path.count("/") + 3 # The original cwd walk from root and back
+			return
+		parent = path.rpartition("/")[0]
+		if parent:
+			self.mkdir(parent)
+		try:
+			self.ftp.mkd(path)
+		except ftplib.error_perm: # It already exists or another connection has just created it
+			pass
+		self.knownDirs.add(path)
 	
 	def rename (self, original, new):
 		"""
 		Rename a file on the server
 		"""
-		self.ftp.rename(original, new)
+		try:
+			self.ftp.rename(original, new)
+		except ftplib.error_perm:
+			raise FileNotFoundError
 	
 	def remove (self, fileName, isDir = False):
 		"""
 		Remove a file on the server
 		"""
 		if isDir:
-			for name, dir in self.ls(fileName):
-				self.remove(name, dir)
-			self.ftp.rmd(fileName)
+			entries = list(self.walk(fileName))
+			for name, dir in entries:
+				if not dir:
+					self.remove(name)
+			for name, dir in reversed(entries):
+				if dir:
+					self.rmdir(name)
+			self.rmdir(fileName)
 		else:
 			try:
 				self.ftp.delete(fileName)
 			except ftplib.error_perm:
 				raise FileNotFoundError
 	
-	def download (self, path, stream, listener = None):
+	def rmdir (self, path):
+		"""
+		Remove an empty directory on the server
+		"""
+		try:
+			self.ftp.rmd(path)
+		except ftplib.error_perm:
+			raise FileNotFoundError
+		path = self.normalizePath(path)
+		self.knownDirs = {directory for directory in self.knownDirs if directory != path and not directory.startswith(path + "/")}
+	
+	def download (self, path, stream, listener = None, size = None):
 		"""
 		Download a file from the server into a stream (preferably binary)
+		If the size of the file is already known (e.g. from a listing), the progress listener doesn't have to ask for it
 		"""
-		if listener:
-			try:
-				size = self.ftp.size(path)
-			except ftplib.error_perm:
-				size = 0
-		self.ftp.voidcmd("TYPE I")
+		self.setBinary()
+		if listener and size is None:
+			size = self.getSize(path)
+		compress = self.setMode("Z" if self.isCompressible(path) else "S")
 		try:
 			connection = self.ftp.transfercmd("RETR {0}".format(path))
 		except ftplib.error_perm:
 			raise FileNotFoundError
-		while True:
-			fileBuffer = connection.recv(self.bufferSize)
-			if not fileBuffer:
-				if listener:
-					listener.finish()
-				stream.seek(0)
-				break
-			try:
-				stream.write(fileBuffer)
-			except TypeError: # We aren't a byte stream, are we?
-				stream.write(fileBuffer.decode(stream.encoding if stream.encoding else "utf-8"))
-			if listener:
-				position = stream.tell()
-				stream.seek(0)
-				content = stream.read()
-				stream.seek(position)
-				if not isinstance(content, bytes):
-					content = content.encode(stream.encoding if stream.encoding else "utf-8")
-				percent = round((len(content)/float(size)) * 100) if size else 0
-				listener.setValue(percent)
+		self.receiveStream(connection, stream, self.getProgress(listener, size) if listener else None, zlib.decompressobj() if compress else None)
+		if listener:
+			listener.finish()
+		stream.seek(0)
 		connection.close()
 		self.ftp.voidresp()
-		self.cdRoot()
+		self.roundTripsSaved += 1 # No need to go back to the root
 	
-	def upload (self, stream, path, safe = False, rename = True, listener = None):
+	def upload (self, stream, path, safe = False, rename = True, listener = None, resume = False, onOpen = None):
 		"""
 		Upload a stream (preferably binary) to the server
+		If resume is set, a partial file left on the server by an interrupted upload of the same stream is completed instead
+		If onOpen is given, it is called once the transfer has started writing to the file
 		"""
 		stream.seek(0)
-		if listener:
-			size = len(stream.read())
-			stream.seek(0)
-			finished = 0
-		slashPosition = path.rfind("/")
-		if slashPosition < 0:
-			slashPosition = False
-		remotePath = path[slashPosition + 1 : ] if slashPosition else path
+		size = self.getStreamSize(stream)
+		remotePath = path
 		if safe:
-			originalPath = remotePath
-			remotePath = self.getSafeFilename(remotePath)
-		if slashPosition:
-			self.cd(path[0 : slashPosition])
-		self.ftp.voidcmd("TYPE I")
-		try:
-			connection = self.ftp.transfercmd("STOR {0}".format(remotePath))
-			if listener:
-				listener.setValue(0)
-			while True:
-				fileBuffer = stream.read(self.bufferSize)
-				if not fileBuffer:
+			remotePath = self.getSafeFilename(path)
+		for attempt in range(self.uploadRetries + 1):
+			opened = False
+			try:
+				stream.seek(0)
+				self.prepareParent(path)
+				self.setBinary()
+				offset = self.getResumeOffset(remotePath, size) if resume else 0
+				if not offset or offset < size:
+					command = "STOR"
+					compress = self.setMode("Z" if not offset and self.isCompressible(path) else "S") # Restarted transfers aren't compressed
+					if offset:
+						stream.seek(offset)
+						if not self.restartAt(offset):
+							command = "APPE"
+					connection = self.ftp.transfercmd("{0} {1}".format(command, remotePath))
+					opened = True
+					if onOpen:
+						onOpen()
 					if listener:
-						listener.finish()
-					break
-				if not isinstance(fileBuffer, bytes):
-					fileBuffer = fileBuffer.encode(stream.encoding if stream.encoding else "utf-8")
-				sent = connection.send(fileBuffer)
-				if listener:
-					finished += sent
-					if size is None:
 						listener.setValue(0)
-					else:
-						listener.setValue(round((finished/float(size))*100))
-			connection.close()
-		except BrokenPipeError:
-			self.connect()
-			self.upload(stream, path, safe, rename, listener)
-		
-		self.ftp.voidresp()
+					progress = self.getProgress(listener, size) if listener else None
+					self.sendStream(stream, connection, (lambda amount: progress(offset + amount)) if progress else None, compress)
+					connection.close()
+					self.ftp.voidresp()
+				if listener:
+					listener.finish()
+				break
+			except BrokenPipeError:
+				if attempt == self.uploadRetries:
+					raise
+				self.reconnect()
+				resume = resume or opened # A file that this attempt hasn't written to may hold anything (e.g. an older version)
 		if safe and rename:
-			self.rename(remotePath, originalPath)
-		self.cdRoot()
+			self.rename(remotePath, path)
+	
+	def getResumeOffset (self, path, size):
+		"""
+		Get the amount of data an interrupted upload has already stored in a file on the server (0 if it has to start over)
+		"""
+		if size is None:
+			return 0
+		remoteSize = self.getSize(path)
+		if remoteSize is None or remoteSize > size:
+			return 0
+		return remoteSize
+	
+	def restartAt (self, offset):
+		"""
+		Make the next transfer start at given offset (returns False if the server doesn't support restarting uploads)
+		"""
+		try:
+			self.ftp.sendcmd("REST {0}".format(offset))
+		except ftplib.error_perm:
+			return False
+		return True
+	
+	def append (self, stream, path, listener = None):
+		"""
+		Append a stream (preferably binary) to a file on the server (the file is created if it doesn't exist)
+		"""
+		stream.seek(0)
+		if listener:
+			size = self.getStreamSize(stream)
+		self.prepareParent(path)
+		self.setBinary()
+		compress = self.setMode("Z" if self.isCompressible(path) else "S")
+		try:
+			connection = self.ftp.transfercmd("APPE {0}".format(path))
+		except ftplib.error_perm as error:
+			if str(error).startswith(("500", "502", "504")):
+				raise CommandNotSupportedError("The server doesn't support APPE")
+			raise
+		self.sendStream(stream, connection, self.getProgress(listener, size) if listener else None, compress)
+		if listener:
+			listener.finish()
+		connection.close()
+		self.ftp.voidresp()
+	
+	def prepareParent (self, path):
+		"""
+		Make sure the parent directory of given path exists
+		"""
+		parent = self.normalizePath(path).rpartition("/")[0]
+		if not parent:
+			self.roundTripsSaved += 1 # No need to go back to the root
+		elif parent in self.knownDirs:
+			self.roundTripsSaved += 2 # No need to enter the parent directory and go back
+		else:
+			self.mkdir(parent)
+	
+	def sendStream (self, stream, connection, progress = None, compress = False):
+		"""
+		Send the rest of a stream through a data connection (files are sent with sendfile(), other streams through a reused buffer)
+		The progress callback gets the number of bytes (or characters for text streams) sent so far
+		If compress is set, the data is deflated for a MODE Z transfer
+		"""
+		if compress:
+			return self.sendCompressed(stream, connection, progress)
+		if self.isRealFile(stream):
+			offset = start = stream.tell()
+			count = self.bufferSize if self.bandwidthLimit is not None else (self.bufferSize * 16 if progress else None) # Small chunks keep a limited rate steady
+			while True:
+				sent = connection.sendfile(stream, offset, count)
+				if not sent:
+					break
+				offset += sent
+				self.bytesSent += sent
+				self.throttle(sent)
+				if progress:
+					progress(offset - start)
+			return
+		buffer = bytearray(self.bufferSize)
+		view = memoryview(buffer)
+		readInto = getattr(stream, "readinto", None)
+		total = 0
+		while True:
+			if readInto:
+				length = readInto(buffer)
+				chunk = view[:length]
+			else:
+				chunk = stream.read(self.bufferSize)
+				length = len(chunk)
+				if not isinstance(chunk, bytes):
+					chunk = chunk.encode(stream.encoding if stream.encoding else "utf-8")
+			if not length:
+				break
+			connection.sendall(chunk)
+			self.bytesSent += len(chunk)
+			self.throttle(len(chunk))
+			total += length
+			if progress:
+				progress(total)
+	
+	def sendCompressed (self, stream, connection, progress = None):
+		"""
+		Deflate the rest of a stream into a data connection in MODE Z
+		The progress callback gets the amount of uncompressed data sent so far
+		"""
+		compressor = zlib.compressobj(self.compressionLevel)
+		buffer = bytearray(self.bufferSize)
+		view = memoryview(buffer)
+		readInto = getattr(stream, "readinto", None)
+		total = 0
+		sent = 0
+		while True:
+			if readInto:
+				length = readInto(buffer)
+				chunk = view[:length]
+			else:
+				chunk = stream.read(self.bufferSize)
+				length = len(chunk)
+				if not isinstance(chunk, bytes):
+					chunk = chunk.encode(stream.encoding if stream.encoding else "utf-8")
+					length = len(chunk)
+			if not length:
+				break
+			data = compressor.compress(chunk)
+			if data:
+				connection.sendall(data)
+				sent += len(data)
+				self.throttle(len(data))
+			total += length
+			if progress:
+				progress(total)
+		data = compressor.flush()
+		connection.sendall(data)
+		sent += len(data)
+		self.throttle(len(data))
+		self.bytesSent += sent
+		self.bytesSaved += total - sent
+	
+	def receiveStream (self, connection, stream, progress = None, decompressor = None):
+		"""
+		Receive everything from a data connection into a stream through a reused buffer (text streams get decoded data)
+		The progress callback gets the number of bytes received so far
+		If a decompressor is given (for MODE Z transfers), the data is inflated and the callback gets the amount of inflated data
+		"""
+		buffer = bytearray(self.bufferSize)
+		view = memoryview(buffer)
+		decoder = None
+		if isinstance(stream, io.TextIOBase):
+			decoder = codecs.getincrementaldecoder(stream.encoding if stream.encoding else "utf-8")()
+		total = 0
+		while True:
+			length = connection.recv_into(buffer)
+			if not length:
+				break
+			self.bytesReceived += length
+			self.throttle(length)
+			data = view[:length]
+			if decompressor:
+				data = decompressor.decompress(data)
+				self.bytesSaved += len(data) - length
+				length = len(data)
+			if decoder:
+				stream.write(decoder.decode(data))
+			else:
+				stream.write(data)
+			total += length
+			if progress:
+				progress(total)
+		if decompressor:
+			data = decompressor.flush()
+			stream.write(decoder.decode(data) if decoder else data)
+		if decoder:
+			stream.write(decoder.decode(b"", True))
+	
+	def getSize (self, path):
+		"""
+		Get the size of a file on the server using SIZE or MLST (None if the server can't tell)
+		"""
+		try:
+			return self.ftp.size(path)
+		except ftplib.error_perm:
+			pass
+		try:
+			size = self.getFacts(path).get("size", "")
+		except (CommandNotSupportedError, FileNotFoundError):
+			return None
+		return int(size) if size.isdigit() else None
+	
+	def getFacts (self, path):
+		"""
+		Get a dictionary of facts about a file on the server using MLST
+		"""
+		try:
+			response = self.ftp.sendcmd("MLST {0}".format(path))
+		except ftplib.error_perm as error:
+			if str(error).startswith(("500", "501", "502", "504")):
+				raise CommandNotSupportedError("The server doesn't support MLST")
+			raise FileNotFoundError
+		lines = response.split("\n")
+		if len(lines) < 2:
+			raise CommandNotSupportedError("The server sent a malformed MLST response")
+		facts = {}
+		for fact in lines[1].strip().partition(" ")[0].split(";"):
+			name, _, value = fact.partition("=")
+			if name:
+				facts[name.lower()] = value
+		return facts
+	
+	def getStamp (self, path):
+		"""
+		Get a (size, modification time) tuple of a file on the server with as few commands as possible (None if there is no such file)
+		"""
+		if self.mlstSupported:
+			try:
+				facts = self.getFacts(path)
+				if "size" in facts and "modify" in facts:
+					return (int(facts["size"]), facts["modify"])
+			except CommandNotSupportedError:
+				self.mlstSupported = False
+			except FileNotFoundError:
+				return None
+		self.setBinary()
+		try:
+			size = self.ftp.size(path)
+		except ftplib.error_perm:
+			return None
+		try:
+			modify = self.ftp.sendcmd("MDTM {0}".format(path))[4:].strip()
+		except ftplib.error_perm:
+			modify = None
+		return (size, modify)
+	
+	def getFeatures (self):
+		"""
+		Get a set of features the server announces in its reply to FEAT (asked only once)
+		"""
+		if self.features is None:
+			try:
+				response = self.ftp.sendcmd("FEAT")
+			except ftplib.error_perm:
+				response = ""
+			self.features = set(line.strip().upper() for line in response.split("\n")[1:-1] if line.strip())
+		return self.features
+	
+	def getHashAlgorithms (self):
+		"""
+		Get a list of hash algorithms the server can compute (announced in its reply to FEAT), in order of preference
+		"""
+		features = self.getFeatures()
+		hashNames = []
+		for feature in features:
+			if feature.startswith("HASH "):
+				hashNames = [name.rstrip("*") for name in feature[5:].split(";")]
+		return [algorithm for algorithm, hashName, command in self.hashCommands if hashName in hashNames or command in features]
+	
+	def getHash (self, path, algorithm):
+		"""
+		Get the hex digest of a file computed by the server with given algorithm (using HASH or one of the older X commands)
+		"""
+		hashName, command = next((hashName, command) for name, hashName, command in self.hashCommands if name == algorithm)
+		try:
+			if command in self.getFeatures() and not any(feature.startswith("HASH ") and hashName in feature for feature in self.features):
+				digest = self.ftp.sendcmd("{0} {1}".format(command, path)).split()[1]
+			else:
+				if self.hashAlgorithm != hashName:
+					self.ftp.sendcmd("OPTS HASH {0}".format(hashName))
+					self.hashAlgorithm = hashName
+				else:
+					self.roundTripsSaved += 1
+				digest = self.ftp.sendcmd("HASH {0}".format(path)).split()[3] # 213 <algorithm> <range> <digest> <file name>
+		except ftplib.error_perm as error:
+			if str(error).startswith(("500", "501", "502", "504")):
+				raise CommandNotSupportedError("The server can't compute {0} hashes".format(algorithm))
+			if str(error).startswith("550"):
+				raise FileNotFoundError
+			raise HashError(str(error))
+		except IndexError:
+			raise CommandNotSupportedError("The server's reply to a hash command can't be understood")
+		digest = digest.lower()
+		return digest.zfill(8) if algorithm == "crc32" else digest
+	
+	def isCompressible (self, path):
+		"""
+		Check if transfers of given file should be compressed according to the compression settings
+		"""
+		if self.compressionLevel is None:
+			return False
+		extension = path.rpartition("/")[2].rpartition(".")[2].lower() if "." in path.rpartition("/")[2] else ""
+		return extension not in self.uncompressedExtensions
+	
+	def setMode (self, mode):
+		"""
+		Switch to the stream mode ("S") or the compressed mode ("Z") unless the connection already uses it
+		Return True if the next transfer will be compressed
+		"""
+		if mode == "Z" and "MODE Z" not in self.getFeatures():
+			mode = "S"
+		if self.transferMode == mode:
+			if mode == "Z" or self.compressionLevel is not None:
+				self.roundTripsSaved += 1
+			return mode == "Z"
+		try:
+			self.ftp.voidcmd("MODE {0}".format(mode))
+		except ftplib.error_perm:
+			if mode == "S":
+				raise
+			self.features.discard("MODE Z")
+			return self.setMode("S")
+		self.transferMode = mode
+		return mode == "Z"
+	
+	def setBinary (self):
+		"""
+		Switch to binary transfers unless the connection already uses them
+		"""
+		if self.transferType == "I":
+			self.roundTripsSaved += 1
+			return
+		self.ftp.voidcmd("TYPE I")
+		self.transferType = "I"
 	
 	def chmod (self, path, perms):
 		self.ftp.voidcmd("SITE CHMOD {0} {1}".format(perms, path))
-	
-	def getSafeFilename (self, filename):
-		return filename + '.new'
@@ -0,0 +1,368 @@
+import os, stat, time, socket, socketserver, threading, hashlib, zlib
+
+class FTPServer (socketserver.ThreadingTCPServer):
+	"""
+	A small in-process FTP server serving a local directory, a stand-in for a real server in benchmarks and tests
+	
+	It can add latency to every reply and limit the bandwidth of data connections (shared by all connections, like an uplink)
+	to simulate a remote server. It only supports passive transfers and doesn't check passwords. Like a real server, it
+	translates line endings of files transferred in ASCII mode (TYPE A, the default), so binary files sent in that mode get damaged.
+	"""
+	allow_reuse_address = True
+	daemon_threads = True
+	defaultFeatures = ("MLST type*;size*;modify*;unix.mode;", "SIZE", "MDTM", "REST STREAM", "MODE Z", "HASH SHA-1;SHA-256;MD5", "XSHA1", "XMD5")
+	
+	def __init__ (self, root, latency = 0, bandwidth = None, features = None, host = "127.0.0.1", port = 0):
+		"""
+		Set up the server (latency is in seconds per reply, bandwidth in bytes per second, port 0 picks a free port)
+		"""
+		super().__init__((host, port), FTPHandler)
+		self.root = os.path.abspath(root)
+		self.latency = latency
+		self.bandwidth = bandwidth
+		self.features = list(self.defaultFeatures if features is None else features)
+		self.commands = 0
+		self.bytesTransferred = 0
+		self.lock = threading.Lock()
+		self.allowance = 0
+		self.lastTransfer = time.monotonic()
+		self.thread = None
+	
+	def getAddress (self):
+		"""
+		Get the (host, port) tuple the server listens on
+		"""
+		return self.server_address[:2]
+	
+	def start (self):
+		"""
+		Start serving in a background thread
+		"""
+		self.thread = threading.Thread(target = self.serve_forever, daemon = True)
+		self.thread.start()
+		return self
+	
+	def stop (self):
+		"""
+		Stop serving and close the listening socket
+		"""
+		self.shutdown()
+		self.server_close()
+	
+	def countCommand (self):
+		with self.lock:
+			self.commands += 1
+	
+	def throttle (self, amount):
+		"""
+		Wait until given amount of data may pass through the shared bandwidth limit
+		"""
+		with self.lock:
+			self.bytesTransferred += amount
+			if not self.bandwidth:
+				return
+			now = time.monotonic()
+			self.allowance = min(self.bandwidth, self.allowance + (now - self.lastTransfer) * self.bandwidth) - amount
+			self.lastTransfer = now
+			delay = -self.allowance / self.bandwidth if self.allowance < 0 else 0
+		if delay:
+			time.sleep(delay)
+
+class FTPHandler (socketserver.StreamRequestHandler):
+	"""
+	A control connection of the in-process FTP server
+	"""
+	chunkSize = 65536
+	hashNames = {"SHA-1": "sha1", "SHA-256": "sha256", "MD5": "md5"}
+	
+	def setup (self):
+		self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Replies are small, don't let them wait for delayed ACKs
+		super().setup()
+	
+	def handle (self):
+		self.cwd = "/"
+		self.restart = 0
+		self.compressed = False
+		self.transferType = "A"
+		self.passive = None
+		self.renamed = None
+		self.hashAlgorithm = "sha1"
+		self.reply("220 Ready")
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			self.server.countCommand()
+			command, _, argument = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+			handler = getattr(self, "do" + command.upper(), None)
+			if handler is None:
+				self.reply("502 Command not implemented")
+				continue
+			try:
+				if handler(argument) is False:
+					return
+			except (OSError, ValueError, KeyError) as error:
+				self.reply("550 {0}".format(error))
+	
+	def reply (self, text, lines = ()):
+		"""
+		Send a reply (preceded by given lines of a multi-line reply) after the simulated latency
+		"""
+		if self.server.latency:
+			time.sleep(self.server.latency)
+		code = text[:3]
+		message = "".join("{0}-{1}\r\n".format(code, line) if i == 0 else " {0}\r\n".format(line) for i, line in enumerate(lines)) if lines else ""
+		self.wfile.write((message + text + "\r\n").encode("utf-8"))
+	
+	def getPath (self, argument):
+		"""
+		Get the absolute virtual path of an argument
+		"""
+		path = os.path.normpath(os.path.join(self.cwd, argument or "."))
+		return "/" + path.lstrip("/")
+	
+	def getRealPath (self, argument):
+		"""
+		Get the path of a file in the served directory (the path can't escape it)
+		"""
+		return os.path.join(self.server.root, self.getPath(argument).lstrip("/"))
+	
+	def getFacts (self, path, name):
+		fileStat = os.stat(path)
+		fileType = "dir" if stat.S_ISDIR(fileStat.st_mode) else "file"
+		modify = time.strftime("%Y%m%d%H%M%S", time.gmtime(fileStat.st_mtime))
+		return "type={0};size={1};modify={2};unix.mode=0{3:o}; {4}".format(fileType, fileStat.st_size, modify, fileStat.st_mode & 0o777, name)
+	
+	def openData (self):
+		"""
+		Accept the data connection the client was told about in the reply to PASV or EPSV
+		"""
+		if self.passive is None:
+			raise ValueError("Use PASV or EPSV first")
+		connection, address = self.passive.accept()
+		self.passive.close()
+		self.passive = None
+		return connection
+	
+	def sendData (self, data, translate = False):
+		"""
+		Send data through the data connection (line endings are turned into CRLF if translate is set)
+		"""
+		self.reply("150 Opening data connection")
+		connection = self.openData()
+		with connection:
+			if translate:
+				data = data.replace(b"\n", b"\r\n")
+			if self.compressed:
+				data = zlib.compress(data)
+			for start in range(0, len(data), self.chunkSize):
+				chunk = data[start:start + self.chunkSize]
+				self.server.throttle(len(chunk))
+				connection.sendall(chunk)
+		self.reply("226 Transfer complete")
+	
+	def receiveData (self, path, mode):
+		"""
+		Receive a file through the data connection (CRLF line endings are turned into LF in ASCII mode)
+		"""
+		self.reply("150 Opening data connection")
+		connection = self.openData()
+		decompressor = zlib.decompressobj() if self.compressed else None
+		pending = b"" # A CR at the end of a chunk may be followed by an LF in the next one
+		with connection, open(path, mode) as target:
+			if self.restart:
+				target.seek(self.restart)
+				target.truncate()
+			while True:
+				chunk = connection.recv(self.chunkSize)
+				if not chunk:
+					break
+				self.server.throttle(len(chunk))
+				data = decompressor.decompress(chunk) if decompressor else chunk
+				if self.transferType == "A":
+					data = pending + data
+					pending = b"\r" if data.endswith(b"\r") else b""
+					data = data[:len(data) - len(pending)].replace(b"\r\n", b"\n")
+				target.write(data)
+			data = decompressor.flush() if decompressor else b""
+			if self.transferType == "A":
+				data = (pending + data).replace(b"\r\n", b"\n")
+			target.write(data)
+		self.restart = 0
+		self.reply("226 Transfer complete")
+	
+	def doUSER (self, argument):
+		self.reply("331 Password required")
+	
+	def doPASS (self, argument):
+		self.reply("230 Logged in")
+	
+	def doQUIT (self, argument):
+		self.reply("221 Goodbye")
+		return False
+	
+	def doNOOP (self, argument):
+		self.reply("200 OK")
+	
+	def doTYPE (self, argument):
+		transferType = argument.upper().split()
+		if transferType in (["A"], ["A", "N"]):
+			self.transferType = "A"
+		elif transferType in (["I"], ["L", "8"]):
+			self.transferType = "I"
+		else:
+			return self.reply("504 Type not supported")
+		self.reply("200 Type set to {0}".format(self.transferType))
+	
+	def doMODE (self, argument):
+		if argument.upper() == "Z" and "MODE Z" in self.server.features:
+			self.compressed = True
+		elif argument.upper() == "S":
+			self.compressed = False
+		else:
+			return self.reply("504 Mode not supported")
+		self.reply("200 Mode set to {0}".format(argument.upper()))
+	
+	def doFEAT (self, argument):
+		self.reply("211 End", ["Features:"] + self.server.features)
+	
+	def doOPTS (self, argument):
+		name, _, value = argument.partition(" ")
+		if name.upper() == "HASH":
+			if value.upper() not in self.hashNames:
+				return self.reply("501 Unknown algorithm")
+			self.hashAlgorithm = self.hashNames[value.upper()]
+		self.reply("200 OK")
+	
+	def doPWD (self, argument):
+		self.reply('257 "{0}"'.format(self.cwd))
+	
+	def doCWD (self, argument):
+		if not os.path.isdir(self.getRealPath(argument)):
+			return self.reply("550 No such directory")
+		self.cwd = self.getPath(argument)
+		self.reply("250 OK")
+	
+	def doMKD (self, argument):
+		os.mkdir(self.getRealPath(argument))
+		self.reply('257 "{0}" created'.format(self.getPath(argument)))
+	
+	def doRMD (self, argument):
+		os.rmdir(self.getRealPath(argument))
+		self.reply("250 OK")
+	
+	def doDELE (self, argument):
+		os.remove(self.getRealPath(argument))
+		self.reply("250 OK")
+	
+	def doRNFR (self, argument):
+		if not os.path.exists(self.getRealPath(argument)):
+			return self.reply("550 No such file")
+		self.renamed = self.getRealPath(argument)
+		self.reply("350 Ready for RNTO")
+	
+	def doRNTO (self, argument):
+		if self.renamed is None:
+			return self.reply("503 Use RNFR first")
+		os.replace(self.renamed, self.getRealPath(argument))
+		self.renamed = None
+		self.reply("250 OK")
+	
+	def doSITE (self, argument):
+		command, _, rest = argument.partition(" ")
+		if command.upper() != "CHMOD":
+			return self.reply("502 Command not implemented")
+		mode, _, path = rest.partition(" ")
+		os.chmod(self.getRealPath(path), int(mode, 8))
+		self.reply("200 OK")
+	
+	def doSIZE (self, argument):
+		if not os.path.isfile(self.getRealPath(argument)):
+			return self.reply("550 No such file")
+		self.reply("213 {0}".format(os.path.getsize(self.getRealPath(argument))))
+	
+	def doMDTM (self, argument):
+		if not os.path.isfile(self.getRealPath(argument)):
+			return self.reply("550 No such file")
+		self.reply("213 " + time.strftime("%Y%m%d%H%M%S", time.gmtime(os.path.getmtime(self.getRealPath(argument)))))
+	
+	def doMLST (self, argument):
+		if not os.path.exists(self.getRealPath(argument)):
+			return self.reply("550 No such file")
+		self.reply("250 End", ["Listing " + argument, self.getFacts(self.getRealPath(argument), self.getPath(argument))])
+	
+	def doMLSD (self, argument):
+		path = self.getRealPath(argument)
+		if not os.path.isdir(path):
+			return self.reply("550 No such directory")
+		self.sendData("".join(self.getFacts(os.path.join(path, name), name) + "\r\n" for name in sorted(os.listdir(path))).encode("utf-8"))
+	
+	def doLIST (self, argument):
+		path = self.getRealPath(argument)
+		if not os.path.isdir(path):
+			return self.reply("550 No such directory")
+		lines = []
+		for name in sorted(os.listdir(path)):
+			fileStat = os.stat(os.path.join(path, name))
+			lines.append("{0} 1 owner group {1} Jan 01 12:00 {2}\r\n".format(stat.filemode(fileStat.st_mode), fileStat.st_size, name))
+		self.sendData("".join(lines).encode("utf-8"))
+	
+	def doREST (self, argument):
+		self.restart = int(argument)
+		self.reply("350 Restarting at {0}".format(self.restart))
+	
+	def doPASV (self, argument):
+		self.passive = socket.create_server((self.server.getAddress()[0], 0))
+		host, port = self.passive.getsockname()[:2]
+		self.reply("227 Entering Passive Mode ({0},{1},{2})".format(host.replace(".", ","), port >> 8, port & 255))
+	
+	def doEPSV (self, argument):
+		self.passive = socket.create_server((self.server.getAddress()[0], 0))
+		self.reply("229 Entering Extended Passive Mode (|||{0}|)".format(self.passive.getsockname()[1]))
+	
+	def doRETR (self, argument):
+		path = self.getRealPath(argument)
+		if not os.path.isfile(path):
+			return self.reply("550 No such file")
+		with open(path, "rb") as source:
+			source.seek(self.restart)
+			data = source.read()
+		self.restart = 0
+		self.sendData(data, self.transferType == "A")
+	
+	def doSTOR (self, argument):
+		path = self.getRealPath(argument)
+		if not os.path.isdir(os.path.dirname(path)):
+			return self.reply("553 No such directory")
+		self.receiveData(path, "r+b" if self.restart and os.path.isfile(path) else "wb")
+	
+	def doAPPE (self, argument):
+		path = self.getRealPath(argument)
+		if not os.path.isdir(os.path.dirname(path)):
+			return self.reply("553 No such directory")
+		self.restart = 0
+		self.receiveData(path, "ab")
+	
+	def doHASH (self, argument):
+		if not any(feature.startswith("HASH ") for feature in self.server.features):
+			return self.reply("502 Command not implemented")
+		self.replyHash(argument, self.hashAlgorithm, "213 {0} 0-{1} {2} {3}")
+	
+	def doXSHA1 (self, argument):
+		self.replyHash(argument, "sha1", "250 {2}", "XSHA1")
+	
+	def doXMD5 (self, argument):
+		self.replyHash(argument, "md5", "250 {2}", "XMD5")
+	
+	def replyHash (self, argument, algorithm, template, feature = None):
+		if feature is not None and feature not in self.server.features:
+			return self.reply("502 Command not implemented")
+		path = self.getRealPath(argument)
+		if not os.path.isfile(path):
+			return self.reply("550 No such file")
+		checksum = hashlib.new(algorithm)
+		with open(path, "rb") as source:
+			for chunk in iter(lambda: source.read(self.chunkSize), b""):
+				checksum.update(chunk)
+		name = [key for key, value in self.hashNames.items() if value == algorithm][0]
+		self.reply(template.format(name, os.path.getsize(path), checksum.hexdigest(), argument))
@@ -0,0 +1,180 @@
+import os, sys, threading
+from Deployer import Deployer
+from Options import ConfigOptionsParser
+from Scheduler import TokenBucket
+
+class FanOut:
+	"""
+	Deploys the source to several targets (sections of the configuration file) at once
+	
+	The source is scanned and hashed once for all targets that ignore the same files. Each target then loads its object list,
+	compares it with the source and applies the changes in a thread of its own, with its own connections. The changes of all
+	targets are listed and confirmed together. Targets with the same bandwidth limit share it.
+	"""
+	
+	def __init__ (self, frontend = None):
+		self.frontend = frontend
+		self.lock = threading.Lock()
+	
+	def getSourceKey (self, options):
+		"""
+		Get a string that is the same for targets whose source files are the same
+		"""
+		return repr((options.configFile, options.ignore, options.gitIndex, options.hashCache, options.transferJournal, options.rehash, options.memoryLimit))
+	
+	def getTargetFileName (self, fileName, section):
+		"""
+		Get the name of a file written by given target (e.g. metrics.json becomes metrics.production.json)
+		"""
+		root, extension = os.path.splitext(fileName)
+		return "{0}.{1}{2}".format(root, section, extension)
+	
+	def getTargetOptions (self, args, sections, section):
+		"""
+		Get the options of a target: the common section of the configuration file, the target's section and the arguments
+		"""
+		options = ConfigOptionsParser().load(args.configFile, section)
+		options += args
+		options.section = section
+		options.targets = sections # Files written while deploying (e.g. the transfer journal) are kept for each target
+		if options.metrics and not options.metrics.endswith((".ndjson", ".jsonl")): # Lines of NDJSON files can be appended by all targets
+			options.metrics = self.getTargetFileName(options.metrics, section)
+		if options.profile:
+			options.profile = self.getTargetFileName(options.profile, section)
+		return options
+	
+	def getBandwidthLimit (self, options, bandwidthLimits):
+		"""
+		Get the bandwidth limit of a target, shared by all targets with the same limit (None if the target has no limit)
+		"""
+		if not options.bandwidthLimit:
+			return None
+		rate = TokenBucket.parseRate(options.bandwidthLimit)
+		hours = TokenBucket.parseHours(options.bandwidthHours)
+		return bandwidthLimits.setdefault((rate, hours), TokenBucket(rate, hours))
+	
+	def run (self, args, sections):
+		"""
+		Deploy to the targets described by given sections, return True if all deployments succeeded
+		"""
+		sourceFiles = {}
+		bandwidthLimits = {}
+		targets = []
+		for section in sections:
+			options = self.getTargetOptions(args, sections, section)
+			target = Target(self, section, options, sourceFiles.setdefault(self.getSourceKey(options), {}))
+			target.deployer.bandwidthLimit = self.getBandwidthLimit(options, bandwidthLimits)
+			targets.append(target)
+		self.output("Deploying to {0}...".format(", ".join(sections)), important = True)
+		for target in targets:
+			target.start()
+		for target in targets: # Each target stops before applying its changes (unless they needn't be confirmed)
+			target.ready.wait()
+			with self.lock:
+				self.output("{0}:".format(target.section), important = True)
+				for message, important, error in target.messages:
+					self.output(message, important, error)
+				target.messages = None
+		waiting = [target for target in targets if target.waiting]
+		answer = True
+		if waiting:
+			answer = self.confirm("Do you want to apply these changes to {0}?".format(", ".join(target.section for target in waiting)))
+		for target in waiting:
+			target.answer = answer
+			target.confirmed.set()
+		for target in targets:
+			target.join()
+		self.output("Summary:", important = True)
+		for target in targets:
+			if target.error is not None:
+				self.output("{0}: {1}".format(target.section, target.error), error = True)
+			else:
+				self.output("{0}: {1}".format(target.section, "done" if target.completed else "aborted"))
+		return all(target.completed for target in targets)
+	
+	def output (self, message, important = False, error = False, breakLine = True):
+		if self.frontend:
+			self.frontend.output(message, important, error, breakLine)
+	
+	def confirm (self, question):
+		if self.frontend:
+			return self.frontend.confirm(question)
+		return True
+	
+	def interrupt (self):
+		"""
+		Stop all deployments (the targets' threads die with the script)
+		"""
+		self.output("Deployer aborted", important = True)
+		sys.exit(1)
+
+class Target (threading.Thread):
+	"""
+	The deployment to one target of a fan-out, run in a thread and acting as the frontend of its deployer
+	
+	Messages are held back until the deployment asks for a confirmation or finishes, later ones are prefixed with the section.
+	"""
+	
+	def __init__ (self, fanOut, section, options, sourceFiles):
+		super().__init__(name = "deploy-" + section, daemon = True)
+		self.fanOut = fanOut
+		self.section = section
+		self.options = options
+		self.deployer = Deployer(self, sourceFiles)
+		self.messages = []
+		self.ready = threading.Event()
+		self.confirmed = threading.Event()
+		self.waiting = False
+		self.answer = False
+		self.completed = False
+		self.error = None
+	
+	def run (self):
+		try:
+			self.deployer.run(self.deployer.connect(self.options), self.options)
+			self.completed = True
+		except SystemExit: # The changes weren't confirmed
+			pass
+		except Exception as error:
+			self.error = "{0}: {1}".format(type(error).__name__, error) if str(error) else type(error).__name__
+		finally:
+			self.ready.set()
+	
+	def output (self, message, important = False, error = False, breakLine = True):
+		with self.fanOut.lock:
+			if self.messages is not None:
+				self.messages.append((message, important, error))
+			else:
+				self.fanOut.output("\n".join("[{0}] {1}".format(self.section, line) for line in message.split("\n")), important, error, breakLine)
+	
+	def getListener (self):
+		return SilentListener()
+	
+	def getGroupListener (self, count):
+		return SilentListener()
+	
+	def confirm (self, question):
+		"""
+		Wait for the answer to the question asked for all targets
+		"""
+		self.waiting = True
+		self.ready.set()
+		self.confirmed.wait()
+		return self.answer
+
+class SilentListener:
+	"""
+	A progress listener that doesn't show anything (progressbars of concurrent deployments would overwrite each other)
+	"""
+	
+	def getListener (self):
+		return self
+	
+	def setMessage (self, message):
+		pass
+	
+	def setValue (self, progress):
+		pass
+	
+	def finish (self):
+		pass
@@ -0,0 +1,119 @@
+import os, sqlite3, tempfile, threading
+
+class FileMap:
+	"""
+	A file name: file sum mapping that is iterated in sorted order and moves to an on-disk sqlite store when it outgrows its memory budget
+	"""
+	defaultMemoryLimit = 500000 # Number of entries
+	
+	def __init__ (self, memoryLimit = None, items = None):
+		"""
+		Set up an empty mapping (optionally filled with given (name, hash) tuples)
+		"""
+		self.memoryLimit = memoryLimit or self.defaultMemoryLimit
+		self.entries = {}
+		self.database = None
+		self.databaseFile = None
+		self.length = 0
+		self.lock = threading.Lock()
+		if items is not None:
+			for name, checksum in items:
+				self[name] = checksum
+	
+	def spill (self):
+		"""
+		Move the entries kept in memory to the on-disk store
+		"""
+		with self.lock:
+			if self.database is None:
+				descriptor, self.databaseFile = tempfile.mkstemp(prefix = "deployer-", suffix = ".sqlite")
+				os.close(descriptor)
+				self.database = sqlite3.connect(self.databaseFile, check_same_thread = False)
+				self.database.execute("PRAGMA journal_mode = OFF")
+				self.database.execute("PRAGMA synchronous = OFF")
+				self.database.execute("CREATE TABLE files (name TEXT PRIMARY KEY, checksum TEXT) WITHOUT ROWID")
+			self.database.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", self.entries.items())
+			self.database.commit()
+			self.entries = {}
+	
+	def lookup (self, name):
+		"""
+		Get the hash of a file from the on-disk store (None if it isn't there)
+		"""
+		if self.database is None:
+			return None
+		with self.lock:
+			row = self.database.execute("SELECT checksum FROM files WHERE name = ?", (name,)).fetchone()
+		return row[0] if row else None
+	
+	def __setitem__ (self, name, checksum):
+		if name not in self:
+			self.length += 1
+		self.entries[name] = checksum
+		if len(self.entries) > self.memoryLimit:
+			self.spill()
+	
+	def __getitem__ (self, name):
+		try:
+			return self.entries[name]
+		except KeyError:
+			checksum = self.lookup(name)
+			if checksum is None:
+				raise
+			return checksum
+	
+	def __delitem__ (self, name):
+		if name not in self:
+			raise KeyError(name)
+		self.entries.pop(name, None)
+		if self.database is not None:
+			with self.lock:
+				self.database.execute("DELETE FROM files WHERE name = ?", (name,))
+		self.length -= 1
+	
+	def __contains__ (self, name):
+		return name in self.entries or self.lookup(name) is not None
+	
+	def __len__ (self):
+		return self.length
+	
+	def __iter__ (self):
+		return self.keys()
+	
+	def get (self, name, default = None):
+		try:
+			return self[name]
+		except KeyError:
+			return default
+	
+	def items (self):
+		"""
+		A generator of (File name, File's hash) tuples sorted by the file name
+		"""
+		if self.database is None:
+			yield from sorted(self.entries.items())
+			return
+		self.spill()
+		yield from self.database.execute("SELECT name, checksum FROM files ORDER BY name")
+	
+	def keys (self):
+		"""
+		A generator of file names in sorted order
+		"""
+		for name, checksum in self.items():
+			yield name
+	
+	def close (self):
+		"""
+		Remove the on-disk store (if there is one)
+		"""
+		if self.database is not None:
+			self.database.close()
+			os.remove(self.databaseFile)
+			self.database = None
+	
+	def __del__ (self):
+		try:
+			self.close()
+		except Exception:
+			pass
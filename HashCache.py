@@ -0,0 +1,85 @@
+import os, json, time
+
+class HashCache:
+	"""
+	A persistent cache of local file hashes, validated by the size, modification time and inode of each file
+	"""
+	version = 1
+	racyInterval = 2 # Files modified this recently (in seconds) could still change within the same timestamp
+	
+	def __init__ (self, fileName):
+		"""
+		Set up the cache and load its previous contents, if there are any
+		"""
+		self.fileName = fileName
+		self.entries = {}
+		self.seen = set()
+		self.modified = False
+		self.load()
+	
+	def load (self):
+		"""
+		Load the cache file (a missing or corrupted file results in an empty cache)
+		"""
+		try:
+			with open(self.fileName, "r") as cacheFile:
+				data = json.load(cacheFile)
+			if data.get("version") == self.version:
+				self.entries = {name: tuple(entry) for name, entry in data["files"].items()}
+		except (IOError, ValueError, KeyError, AttributeError, TypeError):
+			self.entries = {}
+	
+	def save (self):
+		"""
+		Write the cache to the disk if it has been modified
+		"""
+		if not self.modified:
+			return
+		temporaryName = self.fileName + ".tmp"
+		with open(temporaryName, "w") as cacheFile:
+			json.dump({"version": self.version, "files": self.entries}, cacheFile)
+		os.replace(temporaryName, self.fileName)
+		self.modified = False
+	
+	def clear (self):
+		"""
+		Forget all stored hashes
+		"""
+		if self.entries:
+			self.entries = {}
+			self.modified = True
+	
+	def getStamp (self, fileStat):
+		"""
+		Get the part of a file's stat that decides if a stored hash is still valid
+		"""
+		return (fileStat.st_size, fileStat.st_mtime_ns, fileStat.st_ino)
+	
+	def get (self, fileName, fileStat):
+		"""
+		Get the stored hash of given file or None if the file has changed since it was hashed
+		"""
+		self.seen.add(fileName)
+		entry = self.entries.get(fileName)
+		if entry is not None and entry[:3] == self.getStamp(fileStat):
+			return entry[3]
+		return None
+	
+	def set (self, fileName, fileStat, checksum):
+		"""
+		Store the hash of given file
+		"""
+		self.seen.add(fileName)
+		if fileStat.st_mtime_ns >= (time.time() - self.racyInterval) * 10**9:
+			self.entries.pop(fileName, None) # Don't trust the timestamp of a file that is being written to
+		else:
+			self.entries[fileName] = self.getStamp(fileStat) + (checksum,)
+		self.modified = True
+	
+	def compact (self):
+		"""
+		Evict the entries of files that were not encountered since the cache was loaded
+		"""
+		for fileName in [name for name in self.entries if name not in self.seen]:
+			del self.entries[fileName]
+			self.modified = True
@@ -0,0 +1,99 @@
+import hashlib, os, zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class CRC32:
+	"""
+	A CRC-32 checksum with the interface of hashlib's objects
+	"""
+	
+	def __init__ (self, data = b""):
+		self.value = zlib.crc32(data)
+	
+	def update (self, data):
+		self.value = zlib.crc32(data, self.value)
+	
+	def hexdigest (self):
+		return "{0:08x}".format(self.value)
+
+class Hasher:
+	"""
+	A file hashing engine that streams files in fixed-size chunks and spreads the work over a pool of threads
+	
+	Besides the algorithms known to hashlib, "sha1-git" gives the object IDs git uses for blobs (a SHA-1 of a header and the data)
+	and "crc32" gives CRC-32 checksums.
+	"""
+	algorithm = "sha1"
+	headers = {"sha1-git": ("sha1", b"blob %d\0")} # Algorithms that hash a header with the size of the file before the data
+	chunkSize = 1024 * 1024
+	queueFactor = 4 # How many files per worker can wait in the queue
+	
+	def __init__ (self, workers = None, algorithm = None):
+		"""
+		Set up the engine (the number of workers defaults to the number of CPUs)
+		"""
+		self.workers = max(1, workers or os.cpu_count() or 1)
+		self.algorithm = algorithm or self.algorithm
+	
+	def hashFile (self, fileName):
+		"""
+		Get the hex digest of given file, reading it with a constant amount of memory
+		"""
+		algorithm, header = self.headers.get(self.algorithm, (self.algorithm, None))
+		checksum = CRC32() if algorithm == "crc32" else hashlib.new(algorithm)
+		buffer = bytearray(self.chunkSize)
+		view = memoryview(buffer)
+		with open(fileName, "rb", buffering = 0) as sourceFile:
+			if header is not None:
+				checksum.update(header % os.fstat(sourceFile.fileno()).st_size)
+			while True:
+				length = sourceFile.readinto(buffer)
+				if not length:
+					break
+				checksum.update(view[:length])
+		return checksum.hexdigest()
+	
+	def hashFiles (self, fileNames, getKnownHash = None):
+		"""
+		A generator of (File name, File's hash) tuples in the order in which the hashing finishes (unreadable files are skipped)
+		File names are taken from the iterable only as workers become free. If getKnownHash is given, it is called with each file
+		name and files it returns a hash for (e.g. from a cache) are passed through right away instead of being hashed.
+		"""
+		if self.workers == 1:
+			for fileName in fileNames:
+				checksum = getKnownHash(fileName) if getKnownHash else None
+				if checksum is not None:
+					yield (fileName, checksum)
+					continue
+				try:
+					yield (fileName, self.hashFile(fileName))
+				except IOError:
+					pass
+			return
+		executor = ThreadPoolExecutor(max_workers = self.workers)
+		try:
+			pending = {}
+			fileNames = iter(fileNames)
+			exhausted = False
+			while True:
+				while not exhausted and len(pending) < self.workers * self.queueFactor:
+					try:
+						fileName = next(fileNames)
+					except StopIteration:
+						exhausted = True
+						break
+					checksum = getKnownHash(fileName) if getKnownHash else None
+					if checksum is not None:
+						yield (fileName, checksum)
+						continue
+					pending[executor.submit(self.hashFile, fileName)] = fileName
+				if not pending:
+					break
+				done, notDone = wait(pending, return_when = FIRST_COMPLETED)
+				for future in done:
+					fileName = pending.pop(future)
+					try:
+						yield (fileName, future.result())
+					except IOError:
+						pass
+		finally:
+			executor.shutdown(wait = True, cancel_futures = True)
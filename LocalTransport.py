@@ -0,0 +1,186 @@
+import os, io, time, shutil
+from exceptions import FileNotFoundError
+from Transport import Transport
+from Hasher import Hasher
+
+class LocalTransport (Transport):
+	"""
+	A destination in a directory of the local filesystem (e.g. a mounted web root or a directory used for testing)
+	"""
+	bufferSize = 65536
+	hashAlgorithms = ("sha1", "sha256", "sha512", "md5", "crc32")
+	
+	def __init__ (self, root, bufferSize = None):
+		"""
+		Set up the transport, creating the root directory if it doesn't exist
+		"""
+		self.root = os.path.abspath(os.path.expanduser(root))
+		if bufferSize:
+			self.bufferSize = bufferSize
+		self.roundTripsSaved = 0
+		self.bytesSaved = 0
+		self.bytesSent = 0
+		self.bytesReceived = 0
+		os.makedirs(self.root, exist_ok = True)
+	
+	def clone (self):
+		connection = type(self)(self.root, self.bufferSize)
+		connection.setBandwidthLimit(self.bandwidthLimit)
+		return connection
+	
+	def getPath (self, path):
+		"""
+		Get the path of a file in the local filesystem
+		"""
+		return os.path.join(self.root, self.normalizePath(path or "").lstrip("/"))
+	
+	def isDir (self, path):
+		return os.path.isdir(self.getPath(path))
+	
+	def listDetailed (self, path = None):
+		path = self.normalizePath(path or "")
+		prefix = path + "/" if path and path != "/" else ""
+		try:
+			entries = list(os.scandir(self.getPath(path)))
+		except OSError:
+			raise FileNotFoundError
+		for entry in entries:
+			try:
+				yield (prefix + entry.name, self.getEntryFacts(entry.stat(), entry.is_dir()))
+			except OSError:
+				continue
+	
+	def getEntryFacts (self, fileStat, isDir):
+		"""
+		Get MLST-like facts from a stat result
+		"""
+		modify = time.strftime("%Y%m%d%H%M%S", time.gmtime(fileStat.st_mtime)) + ".{0:06d}".format(fileStat.st_mtime_ns // 1000 % 1000000)
+		facts = {"type": "dir" if isDir else "file", "modify": modify}
+		if not isDir:
+			facts["size"] = str(fileStat.st_size)
+		return facts
+	
+	def mkdir (self, path):
+		os.makedirs(self.getPath(path), exist_ok = True)
+	
+	def rename (self, original, new):
+		try:
+			os.replace(self.getPath(original), self.getPath(new))
+		except OSError:
+			raise FileNotFoundError
+	
+	def remove (self, fileName, isDir = False):
+		try:
+			if isDir:
+				shutil.rmtree(self.getPath(fileName))
+			else:
+				os.remove(self.getPath(fileName))
+		except OSError:
+			raise FileNotFoundError
+	
+	def rmdir (self, path):
+		try:
+			os.rmdir(self.getPath(path))
+		except OSError:
+			raise FileNotFoundError
+	
+	def download (self, path, stream, listener = None, size = None):
+		try:
+			localFile = open(self.getPath(path), "rb")
+		except OSError:
+			raise FileNotFoundError
+		with localFile:
+			if listener and size is None:
+				size = os.fstat(localFile.fileno()).st_size
+			if isinstance(stream, io.TextIOBase):
+				data = localFile.read()
+				stream.write(data.decode(stream.encoding if stream.encoding else "utf-8"))
+				self.bytesReceived += len(data)
+			else:
+				self.bytesReceived += self.copy(localFile, stream, self.getProgress(listener, size) if listener else None)
+		if listener:
+			listener.finish()
+		stream.seek(0)
+	
+	def upload (self, stream, path, safe = False, rename = True, listener = None, resume = False, onOpen = None):
+		stream.seek(0)
+		size = self.getStreamSize(stream)
+		remotePath = self.getSafeFilename(path) if safe else path
+		self.prepareParent(path)
+		offset = 0
+		if resume and size is not None:
+			remoteSize = self.getSize(remotePath)
+			if remoteSize is not None and remoteSize <= size:
+				offset = remoteSize
+		if not offset or offset < size:
+			if offset:
+				stream.seek(offset)
+			with open(self.getPath(remotePath), "r+b" if offset else "wb") as localFile:
+				localFile.seek(offset)
+				localFile.truncate()
+				if onOpen:
+					onOpen()
+				progress = self.getProgress(listener, size) if listener else None
+				self.bytesSent += self.copy(stream, localFile, (lambda amount: progress(offset + amount)) if progress else None)
+		if listener:
+			listener.finish()
+		if safe and rename:
+			self.rename(remotePath, path)
+	
+	def append (self, stream, path, listener = None):
+		stream.seek(0)
+		self.prepareParent(path)
+		with open(self.getPath(path), "ab") as localFile:
+			self.bytesSent += self.copy(stream, localFile, self.getProgress(listener, self.getStreamSize(stream)) if listener else None)
+		if listener:
+			listener.finish()
+	
+	def copy (self, source, destination, progress = None):
+		"""
+		Copy the rest of a stream into a binary file (text is encoded as UTF-8), return the number of bytes copied
+		"""
+		total = 0
+		while True:
+			chunk = source.read(self.bufferSize)
+			if not chunk:
+				break
+			if not isinstance(chunk, bytes):
+				chunk = chunk.encode(getattr(source, "encoding", None) or "utf-8")
+			destination.write(chunk)
+			total += len(chunk)
+			self.throttle(len(chunk))
+			if progress:
+				progress(total)
+		return total
+	
+	def getSize (self, path):
+		try:
+			return os.path.getsize(self.getPath(path))
+		except OSError:
+			return None
+	
+	def getFacts (self, path):
+		try:
+			fileStat = os.stat(self.getPath(path))
+		except OSError:
+			raise FileNotFoundError
+		return self.getEntryFacts(fileStat, os.path.isdir(self.getPath(path)))
+	
+	def getStamp (self, path):
+		try:
+			facts = self.getFacts(path)
+		except FileNotFoundError:
+			return None
+		return (int(facts.get("size", 0)), facts["modify"])
+	
+	def getHashAlgorithms (self):
+		return list(self.hashAlgorithms)
+	
+	def getHash (self, path, algorithm):
+		try:
+			return Hasher(1, algorithm).hashFile(self.getPath(path))
+		except OSError:
+			raise FileNotFoundError
+	
+	def chmod (self, path, perms):
+		os.chmod(self.getPath(path), int(perms, 8))
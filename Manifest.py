@@ -0,0 +1,131 @@
+import gzip, struct
+
+class Manifest:
+	"""
+	Reads and writes the objects file, a list of files present in the destination with their hashes and details
+	
+	The current format is a gzip-compressed binary file starting with a magic string, a version number and the name of the hash
+	algorithm. Each record then contains the file name, the raw digest, the size, the permissions and the modification time.
+	The legacy format (plain "name: hash" lines) can still be read.
+	
+	A journal holds changes made since the objects file was written. It is a series of gzip members appended to each other,
+	each containing records of updated files (marked with "+") and removed ones (marked with "-").
+	"""
+	magic = b"DEPLOYER-OBJECTS"
+	version = 2
+	header = struct.Struct("!BB") # Version, length of the algorithm name
+	record = struct.Struct("!HB") # Length of the name, length of the digest
+	details = struct.Struct("!QIq") # Size, mode, modification time
+	legacyAlgorithm = "sha1"
+	
+	def __init__ (self, algorithm = "sha1"):
+		"""
+		Set up the manifest for hashes computed with given algorithm
+		"""
+		self.algorithm = algorithm
+		self.fileVersion = None
+	
+	def read (self, stream):
+		"""
+		A generator of (File name, File's hash, (size, mode, mtime) or None) tuples read from a binary stream in any known format
+		The algorithm attribute is set to the one the manifest was written with
+		"""
+		position = stream.tell()
+		isCompressed = stream.read(2) == b"\x1f\x8b"
+		stream.seek(position)
+		if isCompressed:
+			yield from self.readBinary(gzip.GzipFile(fileobj = stream, mode = "rb"))
+		else:
+			yield from self.readLegacy(stream)
+	
+	def readBinary (self, stream):
+		if stream.read(len(self.magic)) != self.magic:
+			raise ValueError("Not an objects file")
+		version, algorithmLength = self.header.unpack(self.readExactly(stream, self.header.size))
+		if version > self.version:
+			raise ValueError("Objects file version {0} is not supported".format(version))
+		self.fileVersion = version
+		self.algorithm = self.readExactly(stream, algorithmLength).decode("ascii")
+		while True:
+			head = stream.read(self.record.size)
+			if not head:
+				break
+			yield self.readRecord(stream, head)
+	
+	def readRecord (self, stream, head = b"", withDetails = True):
+		"""
+		Read a (File name, File's hash, (size, mode, mtime)) record, head being its part that has already been read
+		"""
+		if len(head) < self.record.size:
+			head += self.readExactly(stream, self.record.size - len(head))
+		nameLength, digestLength = self.record.unpack(head)
+		name = self.readExactly(stream, nameLength).decode("utf-8")
+		checksum = self.readExactly(stream, digestLength).hex()
+		if not withDetails:
+			return (name, checksum, None)
+		return (name, checksum, self.details.unpack(self.readExactly(stream, self.details.size)))
+	
+	def readLegacy (self, stream):
+		self.algorithm = self.legacyAlgorithm
+		self.fileVersion = 1
+		for line in stream:
+			line = line.decode("utf-8")
+			if line.find(":") >= 0:
+				(objectName, _, objectHash) = line.rpartition(":") # Hashes never contain a colon, file names might
+				yield (objectName.strip(), objectHash.strip(), None)
+	
+	def readExactly (self, stream, length):
+		data = stream.read(length)
+		if len(data) != length:
+			raise ValueError("Objects file is truncated")
+		return data
+	
+	def write (self, stream, entries):
+		"""
+		Write (File name, File's hash, (size, mode, mtime)) tuples to a binary stream in the current format
+		"""
+		with gzip.GzipFile(fileobj = stream, mode = "wb", mtime = 0) as output:
+			algorithm = self.algorithm.encode("ascii")
+			output.write(self.magic + self.header.pack(self.version, len(algorithm)) + algorithm)
+			for name, checksum, details in entries:
+				output.write(self.pack(name, checksum, details))
+	
+	def pack (self, name, checksum, details = None):
+		"""
+		Get the binary record of a file
+		"""
+		return self.packName(name, bytes.fromhex(checksum)) + self.details.pack(*(details or (0, 0, 0)))
+	
+	def packName (self, name, digest = b""):
+		"""
+		Get the part of a binary record containing the file name and the digest
+		"""
+		name = name.encode("utf-8")
+		return self.record.pack(len(name), len(digest)) + name + digest
+	
+	def readJournal (self, stream):
+		"""
+		A generator of (File name, File's hash, (size, mode, mtime)) changes read from a journal (removed files have None as their hash)
+		"""
+		journal = gzip.GzipFile(fileobj = stream, mode = "rb")
+		while True:
+			operation = journal.read(1)
+			if not operation:
+				break
+			if operation == b"+":
+				yield self.readRecord(journal)
+			elif operation == b"-":
+				yield (self.readRecord(journal, withDetails = False)[0], None, None)
+			else:
+				raise ValueError("Unknown journal record")
+	
+	def writeJournal (self, stream, changes):
+		"""
+		Write a block of (File name, File's hash, (size, mode, mtime)) changes to a journal stream (None as the hash marks a removed file)
+		"""
+		with gzip.GzipFile(fileobj = stream, mode = "wb", mtime = 0) as output:
+			for name, checksum, details in changes:
+				if checksum is None:
+					output.write(b"-" + self.packName(name))
+				else:
+					output.write(b"+" + self.pack(name, checksum, details))
@@ -0,0 +1,90 @@
+import os, json, hashlib, shutil
+
+class ManifestCache:
+	"""
+	Local copies of the objects files of a destination, validated by the size and modification time of the files on the server
+	"""
+	indexFileName = "index.json"
+	
+	def __init__ (self, directory, key):
+		"""
+		Set up the cache of a destination identified by given key (e.g. a host, a path and a configuration section)
+		"""
+		self.path = os.path.join(os.path.expanduser(directory), hashlib.sha1(key.encode("utf-8")).hexdigest())
+		self.current = set() # Files known to match the server during this run
+		try:
+			with open(os.path.join(self.path, self.indexFileName), "r") as indexFile:
+				self.stamps = {name: tuple(stamp) for name, stamp in json.load(indexFile).items()}
+		except (IOError, ValueError, AttributeError, TypeError):
+			self.stamps = {}
+	
+	def getFileName (self, remoteName):
+		"""
+		Get the name of the local copy of a remote file
+		"""
+		return os.path.join(self.path, remoteName.strip("/").replace("/", "%"))
+	
+	def saveIndex (self):
+		os.makedirs(self.path, exist_ok = True)
+		temporaryName = os.path.join(self.path, self.indexFileName + ".tmp")
+		with open(temporaryName, "w") as indexFile:
+			json.dump(self.stamps, indexFile)
+		os.replace(temporaryName, os.path.join(self.path, self.indexFileName))
+	
+	def load (self, remoteName, stamp, stream):
+		"""
+		Copy the local copy of a remote file into a binary stream if its stamp matches the one from the server
+		Return True if the copy could be used
+		"""
+		if stamp is None or stamp[1] is None or self.stamps.get(remoteName) != tuple(stamp):
+			return False
+		try:
+			with open(self.getFileName(remoteName), "rb") as localFile:
+				shutil.copyfileobj(localFile, stream)
+		except IOError:
+			return False
+		stream.seek(0)
+		self.current.add(remoteName)
+		return True
+	
+	def store (self, remoteName, stamp, stream):
+		"""
+		Save the contents of a binary stream as the local copy of a remote file with given stamp
+		"""
+		if stamp is None or stamp[1] is None:
+			return self.remove(remoteName)
+		os.makedirs(self.path, exist_ok = True)
+		position = stream.tell()
+		stream.seek(0)
+		with open(self.getFileName(remoteName), "wb") as localFile:
+			shutil.copyfileobj(stream, localFile)
+		stream.seek(position)
+		self.stamps[remoteName] = tuple(stamp)
+		self.current.add(remoteName)
+		self.saveIndex()
+	
+	def append (self, remoteName, stamp, stream):
+		"""
+		Append the contents of a binary stream to the local copy of a remote file (which is dropped unless it was current)
+		"""
+		if remoteName not in self.current or stamp is None or stamp[1] is None:
+			return self.remove(remoteName)
+		position = stream.tell()
+		stream.seek(0)
+		with open(self.getFileName(remoteName), "ab") as localFile:
+			shutil.copyfileobj(stream, localFile)
+		stream.seek(position)
+		self.stamps[remoteName] = tuple(stamp)
+		self.saveIndex()
+	
+	def remove (self, remoteName):
+		"""
+		Forget the local copy of a remote file
+		"""
+		self.current.discard(remoteName)
+		if self.stamps.pop(remoteName, None) is not None:
+			self.saveIndex()
+		try:
+			os.remove(self.getFileName(remoteName))
+		except OSError:
+			pass
@@ -0,0 +1,69 @@
+import json, time, contextlib
+
+class Metrics:
+	"""
+	Measurements of the phases of a deployment: wall time, bytes sent and received, files processed, commands sent to the server
+	and the time spent waiting for their replies
+	
+	Transfers and commands are read from the counters of the connections (see Transport), files are counted by the code
+	running the phase.
+	"""
+	counters = ("bytesSent", "bytesReceived", "commands", "replyTime")
+	
+	def __init__ (self):
+		self.started = time.time()
+		self.phases = {}
+	
+	def getCounters (self, connections):
+		return {counter: sum(getattr(connection, counter, 0) for connection in connections) for counter in self.counters}
+	
+	@contextlib.contextmanager
+	def measure (self, phase, getConnections = list):
+		"""
+		A context manager that adds what happens in it to given phase, it yields the phase's record to set the number of files in
+		getConnections is called at the start and at the end to get the connections whose counters are read
+		"""
+		record = self.phases.setdefault(phase, dict({"time": 0, "files": 0}, **{counter: 0 for counter in self.counters}))
+		before = self.getCounters(getConnections())
+		start = time.perf_counter()
+		try:
+			yield record
+		finally:
+			record["time"] += time.perf_counter() - start
+			after = self.getCounters(getConnections())
+			for counter in self.counters:
+				record[counter] += after[counter] - before[counter]
+	
+	def getTime (self, phase):
+		"""
+		Get the time spent in given phase in seconds (0 if it didn't run)
+		"""
+		return self.phases.get(phase, {}).get("time", 0)
+	
+	def getReport (self, details = None):
+		"""
+		Get a JSON-serializable dictionary with the metrics of all phases and their totals (details are added to it)
+		"""
+		phases = {}
+		total = dict({"time": 0, "files": 0}, **{counter: 0 for counter in self.counters})
+		for phase, record in self.phases.items():
+			phases[phase] = dict(record, averageReplyTime = record["replyTime"] / record["commands"] if record["commands"] else None)
+			for key in total:
+				total[key] += record[key]
+		total["averageReplyTime"] = total["replyTime"] / total["commands"] if total["commands"] else None
+		report = {"started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started))}
+		report.update(details or {})
+		report.update(phases = phases, total = total)
+		return report
+	
+	def save (self, fileName, details = None):
+		"""
+		Write the report to a file, as a JSON document or, if the file's extension is .ndjson or .jsonl, as a line appended to it
+		"""
+		report = self.getReport(details)
+		if fileName.endswith((".ndjson", ".jsonl")):
+			with open(fileName, "a") as metricsFile:
+				metricsFile.write(json.dumps(report) + "\n")
+		else:
+			with open(fileName, "w") as metricsFile:
+				json.dump(report, metricsFile, indent = 4)
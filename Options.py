@@ -1,8 +1,14 @@
+from exceptions import OptionError
+from Scheduler import TokenBucket
+
 class Options:
 	dry = False
 	configFile = "deploy.json"
 	logFile = "deployer.log"
+	logRotateSize = 1048576
+	logRotateCount = 5
 	section = None
+	targets = None
 	confirm = True
 	quiet = False
 	log = True
@@ -15,11 +21,36 @@ class Options:
 	clean = None
 	enableClean = True
 	generateObjects = False
+	hashCache = ".deployer-cache"
+	transferJournal = ".deployer-transfers"
+	rehash = False
+	hashWorkers = None
+	jobs = 1
+	bufferSize = None
+	memoryLimit = None
+	journal = False
+	journalLimit = 262144
+	manifestCache = "~/.cache/deployer"
+	detectMoves = True
+	gitIndex = False
+	bundleUrl = None
+	bundleSize = None
+	compressionLevel = None
+	verify = False
+	uncompressedExtensions = None
+	metrics = None
+	profile = None
+	watch = False
+	watchPolling = False
+	watchDebounce = None
+	keepAliveInterval = 60
+	priority = None
+	bandwidthLimit = None
+	bandwidthHours = None
 	
 	def __iadd__ (self, options):
-		for option, value in options.__dict__.items():
-			if value != getattr(type(self), option):
-				setattr(self, option, value)
+		for option, value in options.__dict__.items(): # Options that haven't been set aren't in the instance's dictionary
+			setattr(self, option, value)
 		return self
 	
 	def __repr__ (self):
@@ -29,20 +60,52 @@ class Options:
 		setattr(self, attr, value)
 
 class ArgumentOptionsParser:
+	def getType (self, parse):
+		"""
+		Get an argument type checked by given parsing function, which reports an invalid value by raising OptionError
+		"""
+		from argparse import ArgumentTypeError
+		def check (value):
+			try:
+				parse(value)
+			except OptionError as error:
+				raise ArgumentTypeError(str(error))
+			return value
+		return check
+	
 	def load (self):
 		"""
 		Parse command line arguments
 		"""
-		from argparse import ArgumentParser
+		from argparse import ArgumentParser, SUPPRESS
 		options = Options()
-		parser = ArgumentParser(description = "Deploy web applications to an FTP server")
+		parser = ArgumentParser(description = "Deploy web applications to an FTP server", argument_default = SUPPRESS) # Only given arguments are set
 		parser.add_argument("-d", "--dry-run", dest = "dry", action = "store_true", help = "Perform a check without changing the files at the destination")
 		parser.add_argument("-g", "--generate-objects", dest = "generateObjects", action = "store_true", help = "Generate a local copy of the objects file")
 		parser.add_argument("-c", "--config-file", dest = "configFile", help = "The name of the (optional) configuration file (defaults to {0})".format(options.configFile))
 		parser.add_argument("-s", "--section", dest = "section", help = "The section of a configuration file to read from")
+		parser.add_argument("-t", "--targets", dest = "targets", nargs = "+", metavar = "SECTION", help = "Deploy to the targets described by given sections of the configuration file at once (the source is only hashed once)")
 		parser.add_argument("-y", "--yes", dest = "confirm", action = "store_false", help = "Apply changes without confirmation (Use reasonably)")
 		parser.add_argument("-q", "--quiet", dest = "quiet", action = "store_true", help = "Process the script quietly, without any output")
 		parser.add_argument("-l", "--no-logging", dest = "log", action = "store_true", help = "Don't log anything on the server")
+		parser.add_argument("--rehash", dest = "rehash", action = "store_true", help = "Ignore the local hash cache and hash all files again")
+		parser.add_argument("--hash-workers", dest = "hashWorkers", type = int, help = "Number of threads used to hash local files (defaults to the number of CPUs)")
+		parser.add_argument("-j", "--jobs", dest = "jobs", type = int, help = "Number of simultaneous FTP connections (defaults to {0})".format(options.jobs))
+		parser.add_argument("--buffer-size", dest = "bufferSize", type = int, help = "Size of the buffer used for file transfers in bytes (defaults to 65536)")
+		parser.add_argument("--memory-limit", dest = "memoryLimit", type = int, help = "Number of file entries kept in memory before file lists are moved to a temporary database (defaults to 500000)")
+		parser.add_argument("--journal", dest = "journal", action = "store_true", help = "Append changes to a journal instead of rewriting the whole objects file")
+		parser.add_argument("--no-moves", dest = "detectMoves", action = "store_false", help = "Upload moved files again instead of moving them on the server")
+		parser.add_argument("--git", dest = "gitIndex", action = "store_true", help = "List source files from the git index and reuse its object IDs instead of hashing clean files")
+		parser.add_argument("--bundle", dest = "bundleUrl", help = "Upload small files in archives unpacked by a script on the server, invoked at given URL of the destination's root")
+		parser.add_argument("-z", "--compress", dest = "compressionLevel", type = int, nargs = "?", const = 6, help = "Compress transfers with MODE Z if the server supports it (with given zlib level, defaults to 6)")
+		parser.add_argument("--priority", dest = "priority", nargs = "+", metavar = "PATTERN", help = "Upload (and put in place) files matching given patterns first, in the order of the patterns")
+		parser.add_argument("--limit-rate", dest = "bandwidthLimit", metavar = "RATE", type = self.getType(TokenBucket.parseRate), help = "Limit the bandwidth of all connections together to given bytes per second (K, M and G suffixes are allowed, e.g. 500K)")
+		parser.add_argument("--limit-hours", dest = "bandwidthHours", metavar = "HOURS", type = self.getType(TokenBucket.parseHours), help = "Only limit the bandwidth between given hours of the day (e.g. 9-18)")
+		parser.add_argument("--verify", dest = "verify", action = "store_true", help = "Check that the files in the destination match the object list and upload the ones that don't")
+		parser.add_argument("-w", "--watch", dest = "watch", action = "store_true", help = "Keep running and deploy changes of the source as soon as they happen")
+		parser.add_argument("--poll", dest = "watchPolling", action = "store_true", help = "Look for changes by polling instead of using inotify in watch mode")
+		parser.add_argument("--metrics", dest = "metrics", help = "Write the time, transfers, files and commands of each phase to given JSON file (appended as a line to .ndjson or .jsonl files)")
+		parser.add_argument("--profile", dest = "profile", help = "Profile the deployment with cProfile and save the statistics to given file")
 		parser.add_argument("--no-clean", dest = "enableClean", action = "store_false", help = "Don't clean any directories")
 		parser.add_argument("-a", "--address", dest = "host", help = "FTP server address")
 		parser.add_argument("-u", "--username", dest = "username", help = "FTP server username")
@@ -50,8 +113,7 @@ class ArgumentOptionsParser:
 		parser.add_argument("-i", "--ignore", dest = "ignore", nargs = "+", action = "append", help = "Ignored files/directories")
 		parser.add_argument("--path", dest = "path", help = "Path to the root of the application on the FTP server")
 		for key, value in parser.parse_args().__dict__.items():
-			if value:
-				options[key] = value
+			options[key] = value
 		return options
 
 class ConfigOptionsParser:
@@ -68,4 +130,17 @@ class ConfigOptionsParser:
 						options[option] = value
 				except KeyError:
 					pass
+		self.check(options, configFile)
 		return options
+	
+	def check (self, options, configFile):
+		"""
+		Check the values that would only be found invalid once the deployment has started
+		Raises OptionError if one of them is invalid
+		"""
+		try:
+			if options.bandwidthLimit:
+				TokenBucket.parseRate(options.bandwidthLimit)
+			TokenBucket.parseHours(options.bandwidthHours)
+		except OptionError as error:
+			raise OptionError("{0} (in {1})".format(error, configFile))
@@ -0,0 +1,117 @@
+import os, re, time, threading
+from exceptions import OptionError
+
+class TransferScheduler:
+	"""
+	Decides the order files are transferred in: files matching earlier priority patterns go first and, among files of the same
+	priority, the largest ones first
+	
+	The connections of a pool take the next file as soon as they are done with one, so starting with the largest files keeps
+	a big file from being left to a single connection at the end while the others are idle (longest processing time first).
+	"""
+	
+	def __init__ (self, priorities = None):
+		"""
+		Set up the scheduler with a list of compiled patterns, from the most urgent one
+		"""
+		self.priorities = list(priorities or [])
+	
+	def getPriority (self, fileName):
+		"""
+		Get the index of the first pattern matching given file (files matching none of them come last)
+		"""
+		for index, pattern in enumerate(self.priorities):
+			if pattern.match(fileName):
+				return index
+		return len(self.priorities)
+	
+	def getSize (self, fileName):
+		try:
+			return os.path.getsize(fileName)
+		except OSError:
+			return 0
+	
+	def order (self, fileNames):
+		"""
+		Get a list of given source files in the order they should be uploaded in
+		"""
+		return sorted(fileNames, key = lambda fileName: (self.getPriority(fileName), -self.getSize(fileName), fileName))
+	
+	def group (self, fileNames):
+		"""
+		Split given files into lists of files of the same priority, from the most urgent one (the order of files is kept)
+		"""
+		groups = {}
+		for fileName in fileNames:
+			groups.setdefault(self.getPriority(fileName), []).append(fileName)
+		return [groups[priority] for priority in sorted(groups)]
+
+class TokenBucket:
+	"""
+	A bandwidth limit shared by connections: transfers take tokens (bytes) from a bucket that is refilled at a constant rate
+	and wait when it runs dry
+	
+	The bucket holds up to a second's worth of tokens, so short bursts aren't slowed down. If hours are given, the limit only
+	applies between them (in local time).
+	"""
+	units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+	
+	def __init__ (self, rate, hours = None):
+		self.rate = float(rate)
+		self.capacity = self.rate
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+		self.hours = hours
+		self.lock = threading.Lock()
+	
+	@classmethod
+	def parseRate (cls, value):
+		"""
+		Get a rate in bytes per second from a number or a string with an optional K, M or G suffix (e.g. 500K)
+		Raises OptionError if the rate is invalid
+		"""
+		match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*$", str(value), re.IGNORECASE)
+		if not match or float(match.group(1)) <= 0:
+			raise OptionError("Invalid bandwidth limit: {0}".format(value))
+		return float(match.group(1)) * cls.units[match.group(2).upper()]
+	
+	@classmethod
+	def parseHours (cls, value):
+		"""
+		Get a (start, end) tuple of hours from a string like 9-18 or a list of two hours (None if no hours are given)
+		Raises OptionError if the hours are invalid
+		"""
+		if value is None:
+			return None
+		try:
+			start, end = (int(hour) for hour in (value.split("-") if isinstance(value, str) else value))
+		except (TypeError, ValueError):
+			raise OptionError("Invalid bandwidth limit hours: {0}".format(value))
+		if not (0 <= start <= 24 and 0 <= end <= 24):
+			raise OptionError("Invalid bandwidth limit hours: {0}".format(value))
+		return (start, end)
+	
+	def isActive (self):
+		"""
+		Check if the limit applies at the moment (the hours may wrap around midnight, e.g. 22-6)
+		"""
+		if self.hours is None:
+			return True
+		start, end = self.hours
+		hour = time.localtime().tm_hour
+		return start <= hour < end if start <= end else (hour >= start or hour < end)
+	
+	def consume (self, amount):
+		"""
+		Take given number of bytes that have just been transferred from the bucket, waiting until the rate allows it
+		"""
+		if not self.isActive():
+			return
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+			self.tokens -= amount
+			delay = -self.tokens / self.rate if self.tokens < 0 else 0
+		if delay:
+			time.sleep(delay)
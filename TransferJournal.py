@@ -0,0 +1,80 @@
+import os, json, time, threading
+
+class TransferJournal:
+	"""
+	A local record of uploads staged in the destination (as .new files) that haven't been renamed to their final names yet,
+	so that a deployment that has been interrupted can resume partial uploads and skip finished ones when it is run again
+	"""
+	version = 1
+	partial = "partial"
+	staged = "staged"
+	saveInterval = 1 # Minimal time between two writes of the journal in seconds
+	
+	def __init__ (self, fileName, key):
+		"""
+		Set up the journal of the destination identified by given key and load its previous contents (if they belong to it)
+		"""
+		self.fileName = fileName
+		self.key = key
+		self.entries = {}
+		self.modified = False
+		self.lastSave = 0
+		self.lock = threading.Lock()
+		self.load()
+	
+	def load (self):
+		"""
+		Load the journal file (a missing or corrupted file or one kept for another destination results in an empty journal)
+		"""
+		try:
+			with open(self.fileName, "r") as journalFile:
+				data = json.load(journalFile)
+			if data.get("version") == self.version and data.get("key") == self.key:
+				self.entries = {name: tuple(entry) for name, entry in data["files"].items()}
+		except (IOError, ValueError, KeyError, AttributeError, TypeError):
+			self.entries = {}
+	
+	def save (self):
+		"""
+		Write the journal to the disk if it has been modified
+		"""
+		with self.lock:
+			if not self.modified:
+				return
+			temporaryName = self.fileName + ".tmp"
+			with open(temporaryName, "w") as journalFile:
+				json.dump({"version": self.version, "key": self.key, "files": self.entries}, journalFile)
+			os.replace(temporaryName, self.fileName)
+			self.modified = False
+			self.lastSave = time.monotonic()
+	
+	def get (self, fileName, checksum):
+		"""
+		Get the state of the upload of given file (None if there is no record of the file with given hash)
+		"""
+		entry = self.entries.get(fileName)
+		if entry is not None and entry[0] == checksum:
+			return entry[1]
+		return None
+	
+	def set (self, fileName, checksum, state):
+		"""
+		Record the state of the upload of given file (the journal is written to the disk once in a while)
+		"""
+		with self.lock:
+			self.entries[fileName] = (checksum, state)
+			self.modified = True
+		if time.monotonic() - self.lastSave >= self.saveInterval:
+			self.save()
+	
+	def clear (self):
+		"""
+		Forget all uploads (once the staged files have been renamed) and remove the journal file
+		"""
+		with self.lock:
+			self.entries = {}
+			self.modified = False
+			try:
+				os.remove(self.fileName)
+			except OSError:
+				pass
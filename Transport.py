@@ -0,0 +1,242 @@
+import os, io, abc, tempfile
+from exceptions import CommandNotSupportedError
+
+class Transport (abc.ABC):
+	"""
+	The interface of a connection to a destination (all paths are relative to the destination's root)
+	
+	Methods that find out that a file doesn't exist raise exceptions.FileNotFoundError. Streams should be binary, text streams
+	are accepted where it's noted. Transports count the round trips they have avoided in roundTripsSaved and the transferred
+	bytes compression has saved in bytesSaved. They also count the bytes they have sent and received through data transfers,
+	the commands they have sent to the server and the time spent waiting for the first replies to them (in seconds).
+	Data transfers are slowed down to the rate of the bandwidth limit (a Scheduler.TokenBucket) if one is set.
+	"""
+	roundTripsSaved = 0
+	bytesSaved = 0
+	bytesSent = 0
+	bytesReceived = 0
+	commands = 0
+	replyTime = 0
+	bandwidthLimit = None
+	
+	def reconnect (self):
+		"""
+		Set the connection up again after it has failed
+		"""
+		pass
+	
+	def keepAlive (self):
+		"""
+		Keep an idle connection from being closed by the server (reconnecting if it already has been)
+		"""
+		pass
+	
+	@abc.abstractmethod
+	def clone (self):
+		"""
+		Open another connection to the same destination
+		"""
+	
+	def disconnect (self):
+		"""
+		Close the connection
+		"""
+		pass
+	
+	def setCompression (self, level, uncompressedExtensions = None):
+		"""
+		Compress transfers of files (except ones with given extensions) with given zlib level if the transport can do it
+		"""
+		pass
+	
+	def setBandwidthLimit (self, bandwidthLimit):
+		"""
+		Share given bandwidth limit with this connection (None removes the limit)
+		"""
+		self.bandwidthLimit = bandwidthLimit
+	
+	def throttle (self, amount):
+		"""
+		Wait until the bandwidth limit allows given number of bytes that have just been transferred
+		"""
+		if self.bandwidthLimit is not None:
+			self.bandwidthLimit.consume(amount)
+	
+	@abc.abstractmethod
+	def isDir (self, path):
+		"""
+		Check if given path is a directory
+		"""
+	
+	@abc.abstractmethod
+	def listDetailed (self, path = None):
+		"""
+		List a directory, yielding (name, facts) tuples (facts always contain the type of the entry, "file" or "dir")
+		"""
+	
+	def ls (self, path = None):
+		"""
+		List a directory
+		"""
+		for filename, facts in self.listDetailed(path):
+			yield (filename, facts["type"] == "dir")
+	
+	def walk (self, path = None):
+		"""
+		A generator of (name, isDir) tuples of everything under given directory (a directory always precedes its contents)
+		"""
+		for name, isDir in list(self.ls(path)):
+			yield (name, isDir)
+			if isDir:
+				yield from self.walk(name)
+	
+	def normalizePath (self, path):
+		"""
+		Get the canonical form of a path
+		"""
+		while path.startswith("./"):
+			path = path[2:]
+		return path.rstrip("/") if path != "/" else path
+	
+	@abc.abstractmethod
+	def mkdir (self, path):
+		"""
+		Make a directory and all its missing parents
+		"""
+	
+	def prepareParent (self, path):
+		"""
+		Make sure the parent directory of given path exists
+		"""
+		parent = self.normalizePath(path).rpartition("/")[0]
+		if parent:
+			self.mkdir(parent)
+	
+	@abc.abstractmethod
+	def rename (self, original, new):
+		"""
+		Rename a file
+		"""
+	
+	@abc.abstractmethod
+	def remove (self, fileName, isDir = False):
+		"""
+		Remove a file (or a directory with all its contents)
+		"""
+	
+	@abc.abstractmethod
+	def rmdir (self, path):
+		"""
+		Remove an empty directory
+		"""
+	
+	@abc.abstractmethod
+	def download (self, path, stream, listener = None, size = None):
+		"""
+		Download a file into a stream (binary or text) and rewind the stream
+		If the size of the file is already known (e.g. from a listing), the progress listener doesn't have to ask for it
+		"""
+	
+	@abc.abstractmethod
+	def upload (self, stream, path, safe = False, rename = True, listener = None, resume = False, onOpen = None):
+		"""
+		Upload a stream (binary or text) to a file
+		A safe upload stores the data under the temporary name (see getSafeFilename()) and renames the file afterwards if rename is set.
+		If resume is set, a partial file left by an interrupted upload of the same stream is completed instead.
+		If onOpen is given, it is called once the transfer has started writing to the file.
+		"""
+	
+	def append (self, stream, path, listener = None):
+		"""
+		Append a stream (binary or text) to a file (the file is created if it doesn't exist)
+		Raises CommandNotSupportedError if the transport can't append to files.
+		"""
+		raise CommandNotSupportedError("The transport can't append to files")
+	
+	@abc.abstractmethod
+	def getSize (self, path):
+		"""
+		Get the size of a file (None if it can't be found out)
+		"""
+	
+	def getFacts (self, path):
+		"""
+		Get a dictionary of facts about a file in the form of MLST facts (e.g. "type", "size" and "modify")
+		Raises CommandNotSupportedError if the transport can't tell.
+		"""
+		raise CommandNotSupportedError("The transport can't get facts about files")
+	
+	@abc.abstractmethod
+	def getStamp (self, path):
+		"""
+		Get a (size, modification time in the MDTM format) tuple of a file (None if there is no such file)
+		"""
+	
+	def getHashAlgorithms (self):
+		"""
+		Get a list of hash algorithms (named as in hashlib) the destination can compute hashes of its files with
+		"""
+		return []
+	
+	def getHash (self, path, algorithm):
+		"""
+		Get the hex digest of a file computed by the destination with given algorithm
+		Raises FileNotFoundError if the file is missing and HashError if the destination refuses to hash it for another reason.
+		"""
+		raise CommandNotSupportedError("The transport can't compute hashes")
+	
+	@abc.abstractmethod
+	def chmod (self, path, perms):
+		"""
+		Change the permissions of a file (given as an octal string)
+		"""
+	
+	def getSafeFilename (self, filename):
+		"""
+		Get the temporary name a file is uploaded under before it replaces the original
+		"""
+		return filename + '.new'
+	
+	def getProgress (self, listener, size):
+		"""
+		Get a callback that turns a transferred amount into a percentage for given listener (the listener is only notified when the percentage changes)
+		"""
+		last = None
+		def progress (amount):
+			nonlocal last
+			percent = min(100, round((amount/float(size)) * 100)) if size else 0
+			if percent != last:
+				last = percent
+				listener.setValue(percent)
+		return progress
+	
+	def getStreamSize (self, stream):
+		"""
+		Get the amount of data left in a stream without reading it (None if it can't be determined)
+		"""
+		try:
+			if self.isRealFile(stream):
+				return os.fstat(stream.fileno()).st_size - stream.tell()
+			if isinstance(stream, io.BytesIO):
+				return stream.getbuffer().nbytes - stream.tell()
+			position = stream.tell()
+			end = stream.seek(0, io.SEEK_END)
+			stream.seek(position)
+			return end - position
+		except (AttributeError, io.UnsupportedOperation, OSError):
+			return None
+	
+	def isRealFile (self, stream):
+		"""
+		Check if a stream is a binary file backed by a file descriptor (and can therefore be sent with sendfile())
+		Spooled temporary files that are still kept in memory aren't, asking for their descriptor would write them to disk.
+		"""
+		if isinstance(stream, io.TextIOBase):
+			return False
+		if isinstance(stream, tempfile.SpooledTemporaryFile) and not stream._rolled:
+			return False
+		try:
+			stream.fileno()
+		except (AttributeError, io.UnsupportedOperation, OSError):
+			return False
+		return True
@@ -0,0 +1,222 @@
+import os, abc, time, errno, select, struct, ctypes, ctypes.util
+
+class Watcher (abc.ABC):
+	"""
+	Watches the source directory for changes
+	
+	wait() returns a set of paths (relative to the directory) of files and directories that have been created, modified,
+	removed or moved, or None if some changes may have been missed and the whole directory has to be compared again.
+	Changes are debounced: once something changes, they are collected until nothing has changed for a while.
+	"""
+	debounce = 0.25 # Time without changes (in seconds) that ends a batch of changes
+	
+	def __init__ (self, path, isPruned, debounce = None):
+		"""
+		Set up the watcher of a directory (isPruned tells if a directory, named with a trailing slash, can be left out)
+		"""
+		self.path = os.path.abspath(path)
+		self.isPruned = isPruned
+		if debounce is not None:
+			self.debounce = debounce
+	
+	@classmethod
+	def create (cls, path, isPruned, debounce = None, polling = False, pollInterval = None):
+		"""
+		Get the best watcher available (inotify on Linux, polling elsewhere or if it is asked for)
+		"""
+		if not polling:
+			try:
+				return InotifyWatcher(path, isPruned, debounce)
+			except OSError:
+				pass
+		return PollingWatcher(path, isPruned, debounce, pollInterval)
+	
+	def walkDirs (self, start = ""):
+		"""
+		A generator of paths of directories (with a trailing slash, the start itself is included) that aren't pruned
+		"""
+		pending = [start]
+		while pending:
+			directory = pending.pop()
+			yield directory
+			try:
+				entries = os.scandir(os.path.join(self.path, directory) if directory else self.path)
+			except OSError:
+				continue
+			with entries:
+				for entry in entries:
+					try:
+						if entry.is_dir(follow_symlinks = False) and not self.isPruned(directory + entry.name + "/"):
+							pending.append(directory + entry.name + "/")
+					except OSError:
+						pass
+	
+	@abc.abstractmethod
+	def wait (self, timeout = None):
+		"""
+		Wait for a batch of changes for up to given number of seconds (an empty set is returned if nothing has changed)
+		"""
+	
+	def close (self):
+		pass
+
+class InotifyWatcher (Watcher):
+	"""
+	A watcher that gets events from the Linux kernel through inotify (every directory of the tree is watched)
+	"""
+	event = struct.Struct("iIII") # Watch descriptor, mask, cookie, length of the name
+	modify = 0x2
+	attrib = 0x4
+	closeWrite = 0x8
+	movedFrom = 0x40
+	movedTo = 0x80
+	create = 0x100
+	delete = 0x200
+	queueOverflow = 0x4000
+	ignored = 0x8000
+	isDir = 0x40000000
+	onlyDir = 0x01000000
+	dontFollow = 0x02000000
+	mask = modify | attrib | closeWrite | movedFrom | movedTo | create | delete | onlyDir | dontFollow
+	
+	def __init__ (self, path, isPruned, debounce = None):
+		"""
+		Set up the watches (OSError is raised if inotify isn't available or there are too many directories to watch)
+		"""
+		super().__init__(path, isPruned, debounce)
+		try:
+			libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+			self.addWatch = libc.inotify_add_watch
+		except (OSError, AttributeError):
+			raise OSError(errno.ENOSYS, "inotify is not available")
+		self.addWatch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+		self.descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.descriptor < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self.dirs = {} # Watch descriptor: path of the directory
+		try:
+			self.watchTree("")
+		except OSError:
+			self.close()
+			raise
+	
+	def watchTree (self, start):
+		"""
+		Watch a directory and all its subdirectories
+		"""
+		for directory in self.walkDirs(start):
+			watch = self.addWatch(self.descriptor, os.fsencode(os.path.join(self.path, directory)), self.mask)
+			if watch >= 0:
+				self.dirs[watch] = directory
+				continue
+			error = ctypes.get_errno()
+			if error in (errno.ENOSPC, errno.ENOMEM, errno.EACCES) or not directory: # Out of watches or the root itself failed
+				raise OSError(error, "inotify_add_watch failed for {0}".format(directory or self.path))
+	
+	def read (self, timeout):
+		"""
+		Read the pending events (waiting for up to given number of seconds), return the changed paths or None if events were lost
+		"""
+		readable = select.select([self.descriptor], [], [], timeout)[0]
+		if not readable:
+			return set()
+		try:
+			data = os.read(self.descriptor, 65536)
+		except BlockingIOError:
+			return set()
+		changes = set()
+		offset = 0
+		while offset < len(data):
+			watch, mask, cookie, length = self.event.unpack_from(data, offset)
+			name = os.fsdecode(data[offset + self.event.size : offset + self.event.size + length].rstrip(b"\0"))
+			offset += self.event.size + length
+			if mask & self.queueOverflow:
+				return None
+			directory = self.dirs.get(watch)
+			if mask & self.ignored:
+				self.dirs.pop(watch, None)
+				continue
+			if directory is None or not name:
+				continue
+			path = directory + name
+			if mask & self.isDir:
+				if mask & (self.create | self.movedTo) and not self.isPruned(path + "/"):
+					self.watchTree(path + "/") # Files created before the watch was added are found by the deployer
+				elif self.isPruned(path + "/"):
+					continue
+			changes.add(path)
+		return changes
+	
+	def wait (self, timeout = None):
+		changes = self.read(timeout)
+		while changes:
+			more = self.read(self.debounce)
+			if more is None:
+				return None
+			if not more:
+				break
+			changes |= more
+		return changes
+	
+	def close (self):
+		if self.descriptor >= 0:
+			os.close(self.descriptor)
+			self.descriptor = -1
+
+class PollingWatcher (Watcher):
+	"""
+	A watcher that compares the sizes and modification times of all files with the previous ones every once in a while
+	"""
+	pollInterval = 1
+	
+	def __init__ (self, path, isPruned, debounce = None, pollInterval = None):
+		super().__init__(path, isPruned, debounce)
+		if pollInterval:
+			self.pollInterval = pollInterval
+		self.snapshot = self.scan()
+	
+	def scan (self):
+		"""
+		Get a path: (size, modification time) dictionary of the files in the tree
+		"""
+		snapshot = {}
+		for directory in self.walkDirs():
+			try:
+				entries = os.scandir(os.path.join(self.path, directory) if directory else self.path)
+			except OSError:
+				continue
+			with entries:
+				for entry in entries:
+					try:
+						if not entry.is_dir(follow_symlinks = False):
+							fileStat = entry.stat()
+							snapshot[directory + entry.name] = (fileStat.st_size, fileStat.st_mtime_ns)
+					except OSError:
+						pass
+		return snapshot
+	
+	def poll (self):
+		"""
+		Get the paths that have changed since the last poll
+		"""
+		snapshot = self.scan()
+		changes = {path for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp}
+		changes.update(path for path in self.snapshot if path not in snapshot)
+		self.snapshot = snapshot
+		return changes
+	
+	def wait (self, timeout = None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		changes = self.poll()
+		while not changes:
+			delay = self.pollInterval if deadline is None else min(self.pollInterval, deadline - time.monotonic())
+			if delay <= 0:
+				return changes
+			time.sleep(delay)
+			changes = self.poll()
+		while True: # Files may still be being written
+			time.sleep(self.debounce)
+			more = self.poll()
+			if not more:
+				return changes
+			changes |= more
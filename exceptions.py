@@ -6,4 +6,34 @@ class FileNotFoundError (Exception):
 class ConnectionError (Exception):
 	"""
 	An error raised if there is a problem with the connection
-	"""
\ No newline at end of file
+	"""
+
+class CommandNotSupportedError (Exception):
+	"""
+	An error raised if the server doesn't support a command
+	"""
+
+class GitError (Exception):
+	"""
+	An error raised if the git index of the source can't be read
+	"""
+
+class BundleError (Exception):
+	"""
+	An error raised if a bundle can't be unpacked on the server
+	"""
+
+class ManifestError (Exception):
+	"""
+	An error raised if the objects file of the destination can't be read
+	"""
+
+class OptionError (Exception):
+	"""
+	An error raised if an option has an invalid value
+	"""
+
+class HashError (Exception):
+	"""
+	An error raised if the server refuses to compute the hash of a file for a reason other than the file being missing
+	"""
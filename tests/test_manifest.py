@@ -0,0 +1,110 @@
+import os, sys, io, gzip, shutil, tempfile, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Manifest import Manifest
+from Deployer import DestinationInfo
+from LocalTransport import LocalTransport
+
+class ManifestTest (unittest.TestCase):
+	"""
+	Round trips of the objects file and its journal through Manifest
+	"""
+	entries = [
+		("index.php", "da39a3ee5e6b4b0d3255bfef95601890afd80709", (120, 0o644, 1700000000)),
+		("images/logo: dark.png", "a9993e364706816aba3e25717850c26c9cd0d89d", (4096, 0o600, 1700000500)),
+		("pages/été.html", "84983e441c3bd26ebaae4aa1f95129e5e54670f1", (0, 0o755, 0))
+	]
+	
+	def testWriteRead (self):
+		stream = io.BytesIO()
+		Manifest("sha1").write(stream, self.entries)
+		stream.seek(0)
+		manifest = Manifest("sha256")
+		self.assertEqual(list(manifest.read(stream)), self.entries)
+		self.assertEqual(manifest.algorithm, "sha1")
+		self.assertEqual(manifest.fileVersion, Manifest.version)
+	
+	def testReadLegacy (self):
+		stream = io.BytesIO("\n".join("{0}: {1}".format(name, checksum) for name, checksum, details in self.entries).encode("utf-8"))
+		manifest = Manifest("sha256")
+		self.assertEqual(list(manifest.read(stream)), [(name, checksum, None) for name, checksum, details in self.entries])
+		self.assertEqual(manifest.algorithm, Manifest.legacyAlgorithm)
+		self.assertEqual(manifest.fileVersion, 1)
+	
+	def testJournal (self):
+		stream = io.BytesIO()
+		manifest = Manifest()
+		manifest.writeJournal(stream, self.entries[:2])
+		manifest.writeJournal(stream, [(self.entries[0][0], None, None)])
+		stream.seek(0)
+		self.assertEqual(list(manifest.readJournal(stream)), self.entries[:2] + [(self.entries[0][0], None, None)])
+
+class DestinationInfoTest (unittest.TestCase):
+	"""
+	Round trips of the destination information through a destination in a local directory
+	"""
+	files = {"index.php": "da39a3ee5e6b4b0d3255bfef95601890afd80709", "css/style.css": "a9993e364706816aba3e25717850c26c9cd0d89d"}
+	
+	def setUp (self):
+		self.root = tempfile.mkdtemp()
+		self.connection = LocalTransport(self.root)
+	
+	def tearDown (self):
+		shutil.rmtree(self.root)
+	
+	def getPath (self, fileName):
+		return os.path.join(self.root, fileName)
+	
+	def testEmpty (self):
+		info = DestinationInfo(self.connection)
+		self.assertEqual(info.getNames(), [])
+		self.assertIsNone(info.getAlgorithm())
+	
+	def testRebuild (self):
+		DestinationInfo(self.connection).rebuild(self.files, algorithm = "sha256")
+		info = DestinationInfo(self.connection)
+		self.assertEqual(dict(info.getItems()), self.files)
+		self.assertEqual(info.getAlgorithm(), "sha256")
+		self.assertEqual(info.manifest.fileVersion, Manifest.version)
+	
+	def testMigrateLegacy (self):
+		with open(self.getPath(".objects"), "w") as objectsFile:
+			objectsFile.write("\n".join("{0}: {1}".format(name, checksum) for name, checksum in self.files.items()))
+		info = DestinationInfo(self.connection)
+		self.assertEqual(dict(info.getItems()), self.files)
+		self.assertEqual(info.getAlgorithm(), Manifest.legacyAlgorithm)
+		self.assertIsNone(info.getDetails("index.php"))
+		updated = {"about.html": "84983e441c3bd26ebaae4aa1f95129e5e54670f1"}
+		info.update(dict(self.files, **updated), updated, [])
+		self.assertFalse(os.path.exists(self.getPath(".objects.journal"))) # Legacy files are rewritten instead of journaled
+		with open(self.getPath(".objects"), "rb") as objectsFile:
+			self.assertEqual(objectsFile.read(2), b"\x1f\x8b")
+		info = DestinationInfo(self.connection)
+		self.assertEqual(dict(info.getItems()), dict(self.files, **updated))
+		self.assertEqual(info.manifest.fileVersion, Manifest.version)
+	
+	def testReplayJournal (self):
+		info = DestinationInfo(self.connection)
+		info.rebuild(self.files)
+		updated = {"index.php": "84983e441c3bd26ebaae4aa1f95129e5e54670f1"}
+		info.update(dict(self.files, **updated), updated, ["css/style.css"])
+		info.update({"index.php": updated["index.php"], "js/app.js": self.files["css/style.css"]}, {"js/app.js": self.files["css/style.css"]}, [])
+		self.assertTrue(os.path.exists(self.getPath(".objects.journal")))
+		info = DestinationInfo(self.connection)
+		self.assertEqual(dict(info.getItems()), {"index.php": updated["index.php"], "js/app.js": self.files["css/style.css"]})
+		self.assertFalse(info.journalDamaged)
+	
+	def testReplayDamagedJournal (self):
+		info = DestinationInfo(self.connection)
+		info.rebuild(self.files)
+		info.update(self.files, {}, ["css/style.css"])
+		with open(self.getPath(".objects.journal"), "ab") as journalFile:
+			journalFile.write(gzip.compress(b"+" + Manifest().pack("about.html", self.files["index.php"])[:10])) # A record cut short
+		info = DestinationInfo(self.connection)
+		self.assertTrue(info.journalDamaged)
+		self.assertEqual(dict(info.getItems()), {"index.php": self.files["index.php"]})
+		info.update({"index.php": self.files["index.php"]}, {}, [])
+		self.assertFalse(os.path.exists(self.getPath(".objects.journal"))) # A damaged journal is folded into a new objects file
+		self.assertEqual(dict(DestinationInfo(self.connection).getItems()), {"index.php": self.files["index.php"]})
+
+if __name__ == "__main__":
+	unittest.main()